@@ -2,13 +2,21 @@
 
 import pygame
 import random
+import numpy as np
+from hashlife import Hashlife
+from renderer import GridRenderer
 
 class Grid:
+	HASHLIFE_STEPS = 256
+	# generations stepped with update() between two checks of the distance to the edge
+	UPDATE_CHUNK = 64
+
 	def __init__(self, grid_width, grid_height,tile_size):
 		self.grid_width = grid_width
 		self.grid_height = grid_height
 		self.tile_size = tile_size
 		self.cells = set()
+		self.hashlife = None
 
 	def position2cell(self, position):
 		x, y = position
@@ -21,7 +29,10 @@ class Grid:
 	def clear(self):
 		self.cells.clear()
 
-	def reset(self,num=random.randrange(4, 10)):
+	# num live cells per row on average, drawn on each call so seeding before reset() reproduces the board
+	def reset(self,num=None):
+		if num is None:
+			num = random.randrange(4, 10)
 		self.cells = set([(random.randrange(0, self.grid_height), random.randrange(0, self.grid_width)) 
 							for _ in range(num*self.grid_width)])
 
@@ -71,11 +82,105 @@ class Grid:
 		
 		self.cells = new_cells
 
+	# advance n generations. hashlife evolves on the unbounded plane and clips the result to the board, which
+	# only equals repeated update() while nothing reaches the edge. patterns grow at most one cell per generation,
+	# so by default the run goes in chunks: a power-of-two hashlife jump no longer than the live cells' distance
+	# to the edge when that is at least HASHLIFE_STEPS, update() otherwise, re-checking the distance after each.
+	# engine="hashlife" jumps all n at once and clips, engine="update" never uses hashlife
+	def step(self, n=1, engine=None):
+		if engine == "hashlife":
+			self.cells = self.jump(n)
+			return
+		while n > 0:
+			reach = min(self.margin(), n) if engine is None else 0
+			if reach >= self.HASHLIFE_STEPS:
+				chunk = 1 << (reach.bit_length() - 1)
+				self.cells = self.jump(chunk)
+			else:
+				chunk = min(n, self.UPDATE_CHUNK)
+				for _ in range(chunk):
+					self.update()
+			n -= chunk
+
+	def jump(self, n):
+		if self.hashlife is None:
+			self.hashlife = Hashlife()
+		return set((x, y) for x, y in self.hashlife.advance(self.cells, n)
+				   if 0 <= x < self.grid_width and 0 <= y < self.grid_height)
+
+	# distance in cells from the live cells to the nearest edge of the board, any n for an empty board
+	def margin(self):
+		cells = self.cells
+		if not cells:
+			return float("inf")
+		xs = [x for x, _ in cells]
+		ys = [y for _, y in cells]
+		return min(min(xs), self.grid_width - 1 - max(xs), min(ys), self.grid_height - 1 - max(ys))
+
 	def draw(self,screen):
 		for cell in self.cells:
 			top_left = self.cell2position(cell)
 			pygame.draw.rect(screen, Game.BLUE, (*top_left, self.tile_size, self.tile_size))
 
+	# the board as a uint8 array indexed [x, y], 1 for live cells
+	def snapshot(self):
+		board = np.zeros((self.grid_width, self.grid_height), dtype=np.uint8)
+		if self.cells:
+			xs, ys = np.array(list(self.cells)).T
+			inside = (xs >= 0) & (xs < self.grid_width) & (ys >= 0) & (ys < self.grid_height)
+			board[xs[inside], ys[inside]] = 1
+		return board
+
+
+# dense engine: the board is a uint8 array indexed board[x, y], neighbor counts come from shifted-array sums
+class NumpyGrid(Grid):
+	def __init__(self, grid_width, grid_height,tile_size):
+		self.board = np.zeros((grid_width, grid_height), dtype=np.uint8)
+		self.padded = np.zeros((grid_width + 2, grid_height + 2), dtype=np.uint8)
+		self.counts = np.zeros((grid_width, grid_height), dtype=np.uint8)
+		super().__init__(grid_width, grid_height, tile_size)
+
+	@property
+	def cells(self):
+		xs, ys = np.nonzero(self.board)
+		return set(zip(xs.tolist(), ys.tolist()))
+
+	@cells.setter
+	def cells(self, cells):
+		self.board.fill(0)
+		for x, y in cells:
+			if 0 <= x < self.grid_width and 0 <= y < self.grid_height:
+				self.board[x, y] = 1
+
+	def clear(self):
+		self.board.fill(0)
+
+	def add_or_remove(self,position):
+		x, y = self.position2cell(position)
+		if 0 <= x < self.grid_width and 0 <= y < self.grid_height:
+			self.board[x, y] ^= 1
+
+	def update(self):
+		w, h = self.grid_width, self.grid_height
+		padded, counts = self.padded, self.counts
+		padded[1:-1, 1:-1] = self.board
+		counts.fill(0)
+		for dx in [0, 1, 2]:
+			for dy in [0, 1, 2]:
+				if dx == 1 and dy == 1:
+					continue
+				counts += padded[dx:dx + w, dy:dy + h]
+
+		self.board = ((counts == 3) | ((counts == 2) & (self.board == 1))).astype(np.uint8)
+
+	def snapshot(self):
+		return self.board
+
+	def draw(self,screen):
+		colors = np.array([Game.DARK_GREY, Game.BLUE], dtype=np.uint8)
+		surface = pygame.surfarray.make_surface(colors[self.board])
+		screen.blit(pygame.transform.scale(surface, (self.grid_width * self.tile_size, self.grid_height * self.tile_size)), (0, 0))
+
 
 class Game:
 
@@ -86,36 +191,47 @@ class Game:
 	BLACK = (0, 0, 0)
 	DARK_GREY = (80, 78, 81)
 
-	def __init__(self, Width=800, Height=800,Tile_size = 20):
-		pygame.init()
+	def __init__(self, Width=800, Height=800,Tile_size = 20, engine="set", headless=False):
 		self.Width = Width
 		self.Height = Height
 		self.Tile_size = Tile_size
-		self.screen = pygame.display.set_mode((Width, Height))
-		self.clock = pygame.time.Clock()
-		self.grid = Grid(Width//Tile_size, Height//Tile_size, Tile_size)
+		if not headless:
+			pygame.init()
+			self.screen = pygame.display.set_mode((Width, Height))
+			self.clock = pygame.time.Clock()
+		self.grid = ENGINES[engine](Width//Tile_size, Height//Tile_size, Tile_size)
+		if not headless:
+			self.renderer = GridRenderer(self.screen, self.grid.grid_width, self.grid.grid_height, Tile_size,
+										 [Game.DARK_GREY, Game.BLUE], Game.DARK_GREY, Game.BLACK)
 		self.update_freq = 500
 		self.time_passed = 0
 		self.running = True
 		self.pause = True
 		self.FPS = 60
 
+	# only tiles that changed since the last frame are repainted; nothing is redrawn while the board is idle
 	def draw(self):
-		self.screen.fill(Game.DARK_GREY)
-		self.grid.draw(self.screen)
-		for row in range(self.grid.grid_height):
-			pygame.draw.line(self.screen, self.BLACK, (0, row * self.Tile_size), (self.Width, row * self.Tile_size))
-		for col in range(self.grid.grid_width):
-			pygame.draw.line(self.screen, self.BLACK, (col * self.Tile_size, 0), (col * self.Tile_size, self.Height))
-		
-		pygame.display.update()
+		self.renderer.draw(self.grid.snapshot())
+
+	def step(self):
+		self.grid.update()
+
+	# model state for checkpoint.py: json meta and named arrays
+	def state(self):
+		return {}, {"board": self.grid.snapshot()}
+
+	def restore(self, meta, arrays):
+		xs, ys = np.nonzero(arrays["board"])
+		self.grid.cells = set(zip(xs.tolist(), ys.tolist()))
 
 	def update(self):
+		# the clock also ticks while paused so an idle window does not spin
+		elapsed = self.clock.tick(self.FPS)
 		if not self.pause:
-			self.time_passed += self.clock.tick(self.FPS)
+			self.time_passed += elapsed
 			if self.time_passed > self.update_freq:
 				self.time_passed = 0
-				self.grid.update()
+				self.step()
 
 	def get_input(self):
 		for event in pygame.event.get():
@@ -147,6 +263,8 @@ class Game:
 			
 		pygame.quit()
 
+ENGINES = {"set": Grid, "numpy": NumpyGrid}
+
 if __name__ == "__main__":
 	game = Game(800,800,20)
 	game.play()
\ No newline at end of file
@@ -2,20 +2,26 @@
 
 import pygame
 import math
+import functools
+import multiprocessing
+import numpy as np
+import integrators
+import sprites
+import assets
 
 class Planet:
     def __init__(self, x, y, mass=100,radius=50):
         self.x = x
         self.y = y
         self.mass = mass
-        self.image = pygame.transform.scale(pygame.image.load("Planet.png"), (radius * 2, radius * 2))
-        self.rect = self.image.get_rect()
+        self.image = None
+        self.rect = pygame.Rect(0, 0, radius * 2, radius * 2)
         self.rect.center = (self.x, self.y)
         self.radius = radius
         self.speed = -1
         self.off_screen = False
 
-    def move(self):
+    def move(self, game):
         self.rect.centerx += self.speed
         self.x = self.rect.centerx
         self.y = self.rect.centery
@@ -31,52 +37,60 @@ class Planet:
         self.off_screen = False
     
     def draw(self,screen):
+        if self.image is None:
+            self.image = assets.get("Planet.png", (self.radius * 2, self.radius * 2))
         screen.blit(self.image,self.rect)
 
 class Spacecraft:
-    def __init__(self, x, y, vel_x, vel_y, mass=5,size = 20,G = 5):
+    def __init__(self, x, y, vel_x, vel_y, mass=5,size = 20,G = 5, integrator=None):
         self.x = x
         self.y = y
         self.vel_x = vel_x
         self.vel_y = vel_y
         self.mass = mass
         self.G = G
-        self.image =  pygame.transform.scale(pygame.image.load("ship.png"), (size, size))
-        self.image_orig = self.image.copy()
-        self.rect = self.image.get_rect()
+        self.size = size
+        self.frames = None
+        self.fly_angle = 0
+        self.rect = pygame.Rect(0, 0, size, size)
         self.rect.center = (x,y)
         self.off_screen = False
         self.collided = False
         self.speed = math.sqrt(self.vel_x**2 + self.vel_y ** 2)
         self.text = f"speed:{round(self.speed,2)}"
+        self.info = None
+        self.integrator = integrators.Euler() if integrator is None else integrator
+
+    # sprite and label are created on first draw so headless runs never need a display or font
+    def load_sprite(self):
+        self.frames = sprites.rotations("ship.png", (self.size, self.size))
         self.info = Info(self.text, [self.x,self.y-20])
 
-    def move(self, game):
-        distance = math.sqrt((self.x - game.planet.x)**2 + (self.y - game.planet.y)**2)
-        force = (self.G * self.mass * game.planet.mass) / distance ** 2
-        
-        acceleration = force / self.mass
-        angle = math.atan2(game.planet.y - self.y, game.planet.x - self.x)
+    def field(self, planet):
+        return planet_field(planet.x, planet.y, planet.mass, planet.speed, self.G)
 
-        acceleration_x = acceleration * math.cos(angle)
-        acceleration_y = acceleration * math.sin(angle)
+    # specific orbital energy and angular momentum in the planet's frame, conserved up to integration error.
+    # the planet moves before the ships each step, so a ship's state pairs with the planet's next position
+    def invariants(self, planet):
+        dx, dy = self.x - (planet.x + planet.speed), self.y - planet.y
+        vx, vy = self.vel_x - planet.speed, self.vel_y
+        energy = 0.5 * (vx ** 2 + vy ** 2) - self.G * planet.mass / math.sqrt(dx ** 2 + dy ** 2)
+        return energy, dx * vy - dy * vx
 
-        self.vel_x += acceleration_x
-        self.vel_y += acceleration_y
+    def move(self, game):
+        pos, vel = self.integrator.advance(np.array([[self.x, self.y]]), np.array([[self.vel_x, self.vel_y]]),
+                                           0.0, 1.0, self.field(game.planet))
+        self.x, self.y = pos[0].tolist()
+        self.vel_x, self.vel_y = vel[0].tolist()
 
         fly_angle = math.atan2(self.vel_y, self.vel_x)
-        fly_angle = 270 - math.degrees(fly_angle)
+        self.fly_angle = 270 - math.degrees(fly_angle)
         self.speed = math.sqrt(self.vel_x**2 + self.vel_y ** 2)
-        self.image = pygame.transform.rotate(self.image_orig, fly_angle)
-
-        self.x += self.vel_x
-        self.y += self.vel_y
 
         self.rect.centerx = self.x
         self.rect.centery = self.y
 
         self.text = f"speed:{round(self.speed,2)}"
-        self.info.update(self.text, [self.x,self.y-20])
 
 
         if self.rect.top > game.Height or self.rect.bottom < 0 or self.rect.left > game.Width or self.rect.right < 0:
@@ -87,19 +101,99 @@ class Spacecraft:
 
     
     def draw(self,screen):
+        if self.frames is None:
+            self.load_sprite()
+        self.image = sprites.frame(self.frames, self.fly_angle)
         screen.blit(self.image,self.rect) 
+        self.info.update(self.text, [self.x,self.y-20])
         self.info.draw(screen)
 
+# acceleration towards a planet at (x, y) that keeps moving speed pixels per step along x
+def planet_field(x, y, mass, speed, G):
+    def acc(pos, t):
+        d = np.array([x + speed * t, y]) - pos
+        r2 = (d ** 2).sum(1, keepdims=True)
+        return G * mass * d / (r2 * np.sqrt(r2))
+    return acc
+
+
+# every combination of launch position and launch velocity, as (n, 2) arrays
+def launch_grid(xs, ys, vel_xs, vel_ys):
+    x, y, vx, vy = np.meshgrid(xs, ys, vel_xs, vel_ys, indexing="ij")
+    return np.column_stack([x.ravel(), y.ravel()]), np.column_stack([vx.ravel(), vy.ravel()])
+
+
+# integrate all candidate launches at once against the same moving planet, following Game.step.
+# planet is (x, y, mass, radius, speed) at launch time. per candidate:
+#   gain       exit speed minus launch speed, nan if the ship crashed or is still on screen
+#   peak_gain  highest speed reached minus launch speed
+#   collided   the ship hit the planet
+#   exit_step  step on which the ship left the screen, -1 if it crashed or is still on screen
+def simulate(pos, vel, steps=2000, Width=800, Height=600, planet=None, integrator="euler", G=5, size=20):
+    planet_x, planet_y, mass, radius, speed = (Width, Height // 2, 100, 50, -1) if planet is None else planet
+    pos = np.array(pos, dtype=float).reshape(-1, 2)
+    vel = np.array(vel, dtype=float).reshape(-1, 2)
+    n = len(pos)
+    launch = np.sqrt((vel ** 2).sum(1))
+    peak = launch.copy()
+    gain = np.full(n, np.nan)
+    collided = np.zeros(n, dtype=bool)
+    exit_step = np.full(n, -1)
+    active = np.arange(n)
+    stepper = integrators.INTEGRATORS[integrator]()
+    half = size / 2
+
+    for step in range(steps):
+        if not len(active):
+            break
+        planet_x += speed
+        if planet_x + radius < 0:
+            planet_x = Width
+
+        p, v = stepper.advance(pos[active], vel[active], 0.0, 1.0, planet_field(planet_x, planet_y, mass, speed, G))
+        pos[active], vel[active] = p, v
+        current = np.sqrt((v ** 2).sum(1))
+        peak[active] = np.maximum(peak[active], current)
+
+        hit = np.sqrt((p[:, 0] - planet_x) ** 2 + (p[:, 1] - planet_y) ** 2) <= radius
+        # the ship rect centre is rounded half away from zero to whole pixels like pygame.Rect does
+        x, y = np.sign(p[:, 0]) * np.floor(np.abs(p[:, 0]) + 0.5), np.sign(p[:, 1]) * np.floor(np.abs(p[:, 1]) + 0.5)
+        out = ~hit & ((y - half > Height) | (y + half < 0) | (x - half > Width) | (x + half < 0))
+        collided[active[hit]] = True
+        gain[active[out]] = current[out] - launch[active[out]]
+        exit_step[active[out]] = step
+        active = active[~hit & ~out]
+
+    return {"gain": gain, "peak_gain": peak - launch, "collided": collided, "exit_step": exit_step}
+
+
+# simulate split into chunks over a process pool; processes=None runs in this process
+def sweep(pos, vel, processes=None, chunks=None, **kwargs):
+    if not processes or processes == 1:
+        return simulate(pos, vel, **kwargs)
+    pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+    vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+    parts = np.array_split(np.arange(len(pos)), chunks or processes * 4)
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(functools.partial(simulate, **kwargs), [(pos[part], vel[part]) for part in parts])
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
 class Info:
 
     def __init__(self,text,position,size=28):
-        self.font = pygame.font.Font(None, size)
-        self.text = self.font.render(text, True, Game.WHITE)
+        self.size = size
+        self.string = text
+        self.text = sprites.text(text, size, Game.WHITE)
         self.rect = self.text.get_rect()
         self.rect.center = position
 
+    # only re-rendered when the displayed string changes
     def update(self, text, position):
-        self.text = self.font.render(text, True, Game.WHITE)
+        if text != self.string:
+            self.string = text
+            self.text = sprites.text(text, self.size, Game.WHITE)
+            self.rect.size = self.text.get_size()
         self.rect.center = position
 
     def draw(self, screen):
@@ -112,18 +206,21 @@ class Game:
     RED = (255, 0, 0)
     BLUE = (0, 0, 255)
 
-    def __init__(self, Width=800, Height=600):
-        pygame.init()
+    def __init__(self, Width=800, Height=600, headless=False, integrator="euler"):
         self.Width = Width
         self.Height = Height
-        self.screen = pygame.display.set_mode((Width, Height))
-        pygame.display.set_caption("Gravitational Slingshot Effect")
+        if not headless:
+            pygame.init()
+            self.screen = pygame.display.set_mode((Width, Height))
+            pygame.display.set_caption("Gravitational Slingshot Effect")
+            assets.preload(("BG.png", (Width, Height), False), "Planet.png", "ship.png")
+            self.BG = assets.get("BG.png", (Width, Height), alpha=False)
+            self.clock = pygame.time.Clock()
         self.SHIP_MASS = 5
+        self.integrator = integrator
         self.FPS = 60
-        self.BG = pygame.transform.scale(pygame.image.load("BG.png"), (Width, Height))
         self.ships = []
         self.running = True
-        self.clock = pygame.time.Clock()
         self.planet = Planet(Width, Height // 2)
         self.click_count = 0
         self.first_pos = None
@@ -135,9 +232,40 @@ class Game:
         m_x, m_y = mouse_loc
         vel_x = (m_x - t_x) / 100
         vel_y = (m_y - t_y) / 100
-        ship = Spacecraft(t_x, t_y, vel_x, vel_y)
+        ship = Spacecraft(t_x, t_y, vel_x, vel_y, integrator=integrators.INTEGRATORS[self.integrator]())
+        ship.initial_invariants = ship.invariants(self.planet)
         self.ships.append(ship)
 
+    # batch search over launch positions and velocities from the current planet state, see simulate
+    def sweep(self, pos, vel, steps=2000, processes=None):
+        planet = (self.planet.x, self.planet.y, self.planet.mass, self.planet.radius, self.planet.speed)
+        return sweep(pos, vel, processes, Width=self.Width, Height=self.Height, planet=planet,
+                     integrator=self.integrator, steps=steps)
+
+    # model state for checkpoint.py: json meta and named arrays
+    def state(self):
+        ships = np.array([[ship.x, ship.y, ship.vel_x, ship.vel_y] for ship in self.ships]).reshape(-1, 4)
+        invariants = np.array([ship.initial_invariants for ship in self.ships]).reshape(-1, 2)
+        return {"planet": [self.planet.x, self.planet.y]}, {"ships": ships, "ships.invariants": invariants}
+
+    def restore(self, meta, arrays):
+        self.planet.reset(*meta["planet"])
+        self.ships = []
+        for (x, y, vel_x, vel_y), invariants in zip(np.asarray(arrays["ships"]).tolist(), np.asarray(arrays["ships.invariants"]).tolist()):
+            ship = Spacecraft(x, y, vel_x, vel_y, integrator=integrators.INTEGRATORS[self.integrator]())
+            ship.initial_invariants = tuple(invariants)
+            self.ships.append(ship)
+
+    # relative energy and angular momentum drift of each ship in the planet's frame since launch
+    def diagnostics(self):
+        result = []
+        for ship in self.ships:
+            energy, momentum = ship.invariants(self.planet)
+            initial_energy, initial_momentum = ship.initial_invariants
+            result.append({"energy_drift": integrators.drift(energy, initial_energy),
+                           "angular_momentum_drift": integrators.drift(momentum, initial_momentum)})
+        return result
+
 
     def get_input(self):
         self.mouse_pos = pygame.mouse.get_pos()
@@ -167,16 +295,19 @@ class Game:
         pygame.display.update()
 
 
-    def update(self):
-        self.planet.move()
+    def step(self):
+        self.planet.move(self)
         if self.planet.off_screen:
             self.planet.reset(self.Width, self.Height // 2)
 
-        for ship in self.ships:
+        for ship in self.ships[:]:
             ship.move(self)
             if ship.off_screen or ship.collided:
                 self.ships.remove(ship)
 
+    def update(self):
+        self.step()
+
 
     def play(self):
 
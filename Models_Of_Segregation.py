@@ -2,15 +2,18 @@
 
 import pygame
 import random
+import numpy as np
+from collections.abc import Mapping
+from renderer import GridRenderer
 
 class Grid:
-	def __init__(self, grid_width, grid_height,tile_size):
+	def __init__(self, grid_width, grid_height,tile_size, happy_value=4, choice_weight=(0.1,0.45,0.45)):
 		self.grid_width = grid_width
 		self.grid_height = grid_height
 		self.tile_size = tile_size
 		self.cell_type = ["empty", "blue","red"]
-		self.choice_weight = [0.1,0.45,0.45]
-		self.happy_value = 4
+		self.choice_weight = list(choice_weight)
+		self.happy_value = happy_value
 		self.reset_cells()
 		
 	def reset_cells(self):
@@ -19,6 +22,33 @@ class Grid:
 			for y in range(self.grid_height):
 				self.cells[(x,y)] = random.choices(self.cell_type, weights=self.choice_weight)[0]
 
+		# empty cells live in a list with a position index so picking and removing one is O(1)
+		self.empty_cells = [cell for cell, v in self.cells.items() if v == "empty"]
+		self.empty_index = {cell: i for i, cell in enumerate(self.empty_cells)}
+		# only cells whose neighborhood changed since they were last checked can have become unhappy
+		self.dirty = set(self.cells)
+
+	def add_empty(self, cell):
+		self.empty_index[cell] = len(self.empty_cells)
+		self.empty_cells.append(cell)
+
+	def remove_empty(self, cell):
+		i = self.empty_index.pop(cell)
+		last = self.empty_cells.pop()
+		if last != cell:
+			self.empty_cells[i] = last
+			self.empty_index[last] = i
+
+	def mark_dirty(self, pos):
+		x, y = pos
+		for dx in [-1, 0, 1]:
+			if x + dx < 0 or x + dx >= self.grid_width:
+				continue
+			for dy in [-1, 0, 1]:
+				if y + dy < 0 or y + dy >= self.grid_height:
+					continue
+				self.dirty.add((x + dx, y + dy))
+
 	def position2cell(self, position):
 		x, y = position
 		return (x // self.tile_size, y // self.tile_size)
@@ -52,15 +82,23 @@ class Grid:
 		return neighbors, happy
 
 	def update(self):
-	
-		for cell in self.cells:
+		dirty = sorted(self.dirty)
+		self.dirty = set()
+
+		for cell in dirty:
 			if self.cells[cell] != "empty":
 				neighbors, happy = self.get_neighbors(cell)
 				if not happy:
-					empty_cells =  [k for k,v in self.cells.items() if v == 'empty' ]
-					random_empty_cell = random.choice(empty_cells)
+					if not self.empty_cells:
+						self.dirty.add(cell)
+						continue
+					random_empty_cell = self.empty_cells[random.randrange(len(self.empty_cells))]
 					self.cells[random_empty_cell] = self.cells[cell]
 					self.cells[cell] = 'empty'
+					self.remove_empty(random_empty_cell)
+					self.add_empty(cell)
+					self.mark_dirty(cell)
+					self.mark_dirty(random_empty_cell)
 
 
 	def draw(self,screen):
@@ -71,6 +109,121 @@ class Grid:
 			elif color == "red":
 				pygame.draw.rect(screen, Game.RED, (*top_left, self.tile_size, self.tile_size))
 
+	# cell types as an int8 array indexed [x, y], values index cell_type; cells is filled x-major by reset_cells
+	def snapshot(self):
+		codes = {cell_type: i for i, cell_type in enumerate(self.cell_type)}
+		return np.fromiter((codes[v] for v in self.cells.values()), dtype=np.int8,
+						   count=len(self.cells)).reshape(self.grid_width, self.grid_height)
+
+	# the order of empty_cells decides which cell a random pick lands on, so it is saved as well
+	def state(self):
+		h = self.grid_height
+		return {"codes": self.snapshot(),
+				"empty": np.array([x * h + y for x, y in self.empty_cells], dtype=np.int64),
+				"dirty": np.array(sorted(x * h + y for x, y in self.dirty), dtype=np.int64)}
+
+	def restore(self, arrays):
+		h = self.grid_height
+		codes = arrays["codes"].tolist()
+		self.cells = {(x, y): self.cell_type[codes[x][y]] for x in range(self.grid_width) for y in range(h)}
+		self.empty_cells = [divmod(cell, h) for cell in arrays["empty"].tolist()]
+		self.empty_index = {cell: i for i, cell in enumerate(self.empty_cells)}
+		self.dirty = set(divmod(cell, h) for cell in arrays["dirty"].tolist())
+
+
+# dict-style (x,y) -> "empty"/"blue"/"red" view over the int8 codes of an ArrayGrid
+class CellView(Mapping):
+	def __init__(self, grid):
+		self.grid = grid
+
+	def __getitem__(self, cell):
+		return self.grid.cell_type[self.grid.codes[cell]]
+
+	def __setitem__(self, cell, value):
+		self.grid.codes[cell] = self.grid.cell_type.index(value)
+
+	def __iter__(self):
+		for x in range(self.grid.grid_width):
+			for y in range(self.grid.grid_height):
+				yield (x, y)
+
+	def __len__(self):
+		return self.grid.codes.size
+
+
+# array engine: codes[x, y] indexes cell_type, happiness is computed for the whole grid at once
+class ArrayGrid(Grid):
+	EMPTY = 0
+
+	def reset_cells(self):
+		weights = np.array(self.choice_weight, dtype=float)
+		self.codes = np.random.choice(len(self.cell_type), size=(self.grid_width, self.grid_height),
+									  p=weights / weights.sum()).astype(np.int8)
+		self.padded = np.full((self.grid_width + 2, self.grid_height + 2), -1, dtype=np.int8)
+
+	@property
+	def cells(self):
+		return CellView(self)
+
+	def snapshot(self):
+		return self.codes
+
+	def state(self):
+		return {"codes": self.codes}
+
+	def restore(self, arrays):
+		self.codes = np.array(arrays["codes"], dtype=np.int8)
+
+	def same_counts(self):
+		w, h = self.grid_width, self.grid_height
+		padded = self.padded
+		padded[1:-1, 1:-1] = self.codes
+		same = np.zeros((w, h), dtype=np.int8)
+		for dx in [0, 1, 2]:
+			for dy in [0, 1, 2]:
+				if dx == 1 and dy == 1:
+					continue
+				same += padded[dx:dx + w, dy:dy + h] == self.codes
+		return same
+
+	# occupied neighbours of every cell; the padding is -1 so it never counts
+	def occupied_counts(self):
+		w, h = self.grid_width, self.grid_height
+		padded = self.padded
+		padded[1:-1, 1:-1] = self.codes
+		occupied = np.zeros((w, h), dtype=np.int8)
+		for dx in [0, 1, 2]:
+			for dy in [0, 1, 2]:
+				if dx == 1 and dy == 1:
+					continue
+				occupied += padded[dx:dx + w, dy:dy + h] > self.EMPTY
+		return occupied
+
+	def unhappy(self):
+		return (self.codes != self.EMPTY) & (self.same_counts() < self.happy_value)
+
+	# mean share of same-type agents among each agent's occupied neighbours, over agents that have any
+	def segregation_index(self):
+		occupied = self.occupied_counts()
+		agents = (self.codes != self.EMPTY) & (occupied > 0)
+		if not agents.any():
+			return 0.0
+		return float((self.same_counts()[agents] / occupied[agents]).mean())
+
+	def unhappy_fraction(self):
+		agents = np.count_nonzero(self.codes != self.EMPTY)
+		return np.count_nonzero(self.unhappy()) / agents if agents else 0.0
+
+	# every unhappy agent moves at once to a distinct random empty cell; extra agents wait a step
+	def update(self):
+		codes = self.codes.reshape(-1)
+		movers = np.random.permutation(np.flatnonzero(self.unhappy()))
+		targets = np.random.permutation(np.flatnonzero(codes == self.EMPTY))
+		num = min(len(movers), len(targets))
+		movers, targets = movers[:num], targets[:num]
+		codes[targets] = codes[movers]
+		codes[movers] = self.EMPTY
+
 
 
 class Game:
@@ -82,36 +235,46 @@ class Game:
 	BLACK = (0, 0, 0)
 	DARK_GREY = (80, 78, 81)
 
-	def __init__(self, Width=800, Height=800,Tile_size = 20):
-		pygame.init()
+	def __init__(self, Width=800, Height=800,Tile_size = 20, engine="dict", headless=False):
 		self.Width = Width
 		self.Height = Height
 		self.Tile_size = Tile_size
-		self.screen = pygame.display.set_mode((Width, Height))
-		self.clock = pygame.time.Clock()
-		self.grid = Grid(Width//Tile_size, Height//Tile_size, Tile_size)
+		if not headless:
+			pygame.init()
+			self.screen = pygame.display.set_mode((Width, Height))
+			self.clock = pygame.time.Clock()
+		self.grid = ENGINES[engine](Width//Tile_size, Height//Tile_size, Tile_size)
+		if not headless:
+			self.renderer = GridRenderer(self.screen, self.grid.grid_width, self.grid.grid_height, Tile_size,
+										 [Game.DARK_GREY, Game.BLUE, Game.RED], Game.DARK_GREY, Game.BLACK)
 		self.update_freq = 500
 		self.time_passed = 0
 		self.running = True
 		self.pause = True
 		self.FPS = 60
 
+	# only tiles that changed since the last frame are repainted; nothing is redrawn while the board is idle
 	def draw(self):
-		self.screen.fill(Game.DARK_GREY)
-		self.grid.draw(self.screen)
-		for row in range(self.grid.grid_height):
-			pygame.draw.line(self.screen, self.BLACK, (0, row * self.Tile_size), (self.Width, row * self.Tile_size))
-		for col in range(self.grid.grid_width):
-			pygame.draw.line(self.screen, self.BLACK, (col * self.Tile_size, 0), (col * self.Tile_size, self.Height))
-		
-		pygame.display.update()
+		self.renderer.draw(self.grid.snapshot())
+
+	def step(self):
+		self.grid.update()
+
+	# model state for checkpoint.py: json meta and named arrays
+	def state(self):
+		return {}, self.grid.state()
+
+	def restore(self, meta, arrays):
+		self.grid.restore(arrays)
 
 	def update(self):
+		# the clock also ticks while paused so an idle window does not spin
+		elapsed = self.clock.tick(self.FPS)
 		if not self.pause:
-			self.time_passed += self.clock.tick(self.FPS)
+			self.time_passed += elapsed
 			if self.time_passed > self.update_freq:
 				self.time_passed = 0
-				self.grid.update()
+				self.step()
 
 	def get_input(self):
 		for event in pygame.event.get():
@@ -135,6 +298,8 @@ class Game:
 			
 		pygame.quit()
 
+ENGINES = {"dict": Grid, "array": ArrayGrid}
+
 if __name__ == "__main__":
 	game = Game(800,800,10)
 	game.play()
\ No newline at end of file
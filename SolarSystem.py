@@ -2,6 +2,89 @@
 
 import pygame
 import math
+import numpy as np
+import barnes_hut
+import integrators
+import sprites
+import assets
+from ephemeris import Ephemeris
+
+# bounded orbit trail: a ring buffer of world positions with their screen coordinates cached, so each
+# frame only converts points added since the last draw. a point is only kept when it is at least
+# min_distance from the last kept point or turns the trail by at least min_angle radians
+class Trail:
+
+	def __init__(self, capacity=5000, min_distance=0.0, min_angle=0.0):
+		self.capacity = capacity
+		self.min_distance = min_distance
+		self.min_angle = min_angle
+		self.points = np.zeros((capacity, 2))
+		self.screen = np.zeros((capacity, 2))
+		self.head = 0
+		self.count = 0
+		self.pending = 0
+		self.transform = None
+
+	def __len__(self):
+		return self.count
+
+	def __iter__(self):
+		return iter(map(tuple, self.ordered(self.points).tolist()))
+
+	def ordered(self, data):
+		if self.count < self.capacity:
+			return data[:self.count]
+		return np.concatenate([data[self.head:], data[:self.head]])
+
+	def keep(self, point):
+		if self.count < 2 or (self.min_distance <= 0 and self.min_angle <= 0):
+			return True
+		last = self.points[self.head - 1]
+		step = point - last
+		distance = math.hypot(*step)
+		if distance >= self.min_distance > 0:
+			return True
+		if self.min_angle > 0 and distance > 0:
+			previous = last - self.points[self.head - 2]
+			turn = math.atan2(previous[0] * step[1] - previous[1] * step[0], previous @ step)
+			return abs(turn) >= self.min_angle
+		return False
+
+	def append(self, point):
+		point = np.asarray(point, dtype=float)
+		if not self.keep(point):
+			return
+		self.points[self.head] = point
+		self.head = (self.head + 1) % self.capacity
+		self.count = min(self.count + 1, self.capacity)
+		self.pending = min(self.pending + 1, self.capacity)
+
+	def clear(self):
+		self.head = self.count = self.pending = 0
+
+	# replace the trail with points, oldest first
+	def load(self, points):
+		points = np.asarray(points, dtype=float)[-self.capacity:]
+		self.clear()
+		self.points[:len(points)] = points
+		self.count = self.pending = len(points)
+		self.head = len(points) % self.capacity
+
+	def screen_points(self, scale, offset):
+		transform = (scale, offset)
+		if transform != self.transform:
+			self.transform = transform
+			self.pending = self.count
+		if self.pending:
+			new = (np.arange(self.head - self.pending, self.head)) % self.capacity
+			self.screen[new] = self.points[new] * scale + offset
+			self.pending = 0
+		return self.ordered(self.screen)
+
+	def draw(self, screen, color, scale, offset):
+		if len(self) > 2:
+			pygame.draw.lines(screen, color, False, self.screen_points(scale, offset), 2)
+
 
 class Planet:
 
@@ -12,16 +95,18 @@ class Planet:
 		self.radius = radius
 		self.x_vel = x_vel
 		self.y_vel = y_vel
-		self.orbit = []
+		self.orbit = Trail()
 		self.is_sun = is_sun
 		self.color = color
-		self.check()
+		self.image = None
 	
+	# the sun sprite is loaded on first draw so headless runs never touch the png
 	def check(self):
 		if self.is_sun:
-			self.image = pygame.transform.scale(pygame.image.load("Planet.png"), (self.radius * 2, self.radius * 2))
+			self.image = assets.get("Planet.png", (self.radius * 2, self.radius * 2))
 			self.rect = self.image.get_rect()
 			
+	# direct-sum force of object2 on object1, the pairwise reference for the array and barnes-hut solvers
 	@staticmethod
 	def attraction(object1, object2):
 		distance_x = object2.x - object1.x
@@ -29,92 +114,165 @@ class Planet:
 		distance = math.sqrt(distance_x ** 2 + distance_y ** 2)
 
 		force = Game.G * object1.mass * object2.mass / distance**2
-		theta = math.atan2(distance_y, distance_x)
-		force_x = math.cos(theta) * force
-		force_y = math.sin(theta) * force
+		force_x = force * distance_x / distance
+		force_y = force * distance_y / distance
 		return force_x, force_y
 
-	def move(self, planets):
-		total_force_x = total_force_y = 0
-		for planet in planets:
-			if self == planet:
-				continue
-
-			force_x, force_y = Planet.attraction(self,planet)
-			total_force_x += force_x
-			total_force_y += force_y
-
-		acceleration_x = total_force_x / self.mass 
-		acceleration_y = total_force_y / self.mass 
-		self.x_vel += acceleration_x * Game.TIMESTEP
-		self.y_vel += acceleration_y * Game.TIMESTEP
-
-		self.x += self.x_vel * Game.TIMESTEP
-		self.y += self.y_vel * Game.TIMESTEP
-		self.orbit.append((self.x, self.y))
-
-	
 	def draw(self,game):
 		x = self.x * Game.SCALE + game.Width / 2
 		y = self.y * Game.SCALE + game.Height / 2
 
 		if self.is_sun:
+			if self.image is None:
+				self.check()
 			self.rect.center = (x, y)
 			game.screen.blit(self.image,self.rect)
 		else:
 			pygame.draw.circle(game.screen, self.color, (x, y), self.radius)
 
-		if len(self.orbit) > 2:
-			updated_points = []
-			for point in self.orbit:
-				x, y = point
-				x = x * Game.SCALE + game.Width / 2
-				y = y * Game.SCALE + game.Height / 2
-				updated_points.append((x, y))
-
-			pygame.draw.lines(game.screen, self.color, False, updated_points, 2)
+		self.orbit.draw(game.screen, self.color, Game.SCALE, (game.Width / 2, game.Height / 2))
 
 		
 
+# all-pairs gravitational acceleration; each pair i < j is evaluated once and applied to both bodies,
+# in row blocks so memory stays around block * n
+def accelerations(pos, mass, G, block=512):
+	n = len(mass)
+	acc = np.zeros_like(pos)
+	for start in range(0, n, block):
+		end = min(start + block, n)
+		dx = pos[None, start:, 0] - pos[start:end, None, 0]
+		dy = pos[None, start:, 1] - pos[start:end, None, 1]
+		r2 = dx * dx + dy * dy
+		r2[np.tril_indices(end - start)] = np.inf
+		w = 1 / (r2 * np.sqrt(r2))
+		fx = dx * w
+		fy = dy * w
+		acc[start:end, 0] += G * (fx @ mass[start:])
+		acc[start:end, 1] += G * (fy @ mass[start:])
+		acc[start:, 0] -= G * (mass[start:end] @ fx)
+		acc[start:, 1] -= G * (mass[start:end] @ fy)
+	return acc
+
+
+# positions, velocities and masses of every body as arrays; the first rows mirror Game.planets.
+# solver is "direct" or "barnes_hut"; barnes_hut still sums directly below DIRECT_BELOW bodies
+class Bodies:
+	DIRECT_BELOW = 2000
+
+	def __init__(self, pos, vel, mass, solver="direct", theta=0.5, integrator="euler"):
+		self.pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+		self.vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+		self.mass = np.asarray(mass, dtype=float)
+		self.solver = solver
+		self.theta = theta
+		self.integrator = integrators.INTEGRATORS[integrator]()
+		self.t = 0.0
+
+	@classmethod
+	def from_planets(cls, planets):
+		return cls([(p.x, p.y) for p in planets], [(p.x_vel, p.y_vel) for p in planets], [p.mass for p in planets])
+
+	def __len__(self):
+		return len(self.mass)
+
+	def copy(self, rows=slice(None)):
+		bodies = Bodies(self.pos[rows].copy(), self.vel[rows].copy(), self.mass[rows].copy(), self.solver, self.theta)
+		bodies.integrator = type(self.integrator)()
+		bodies.t = self.t
+		return bodies
+
+	def add(self, pos, vel, mass):
+		self.pos = np.concatenate([self.pos, np.asarray(pos, dtype=float).reshape(-1, 2)])
+		self.vel = np.concatenate([self.vel, np.asarray(vel, dtype=float).reshape(-1, 2)])
+		self.mass = np.concatenate([self.mass, np.asarray(mass, dtype=float).reshape(-1)])
+
+	def accelerations(self, pos=None, t=None):
+		pos = self.pos if pos is None else pos
+		if self.solver == "barnes_hut" and len(self) >= self.DIRECT_BELOW:
+			return barnes_hut.accelerations(pos, self.mass, Game.G, self.theta)
+		return accelerations(pos, self.mass, Game.G)
+
+	# the default euler integrator is the semi-implicit step the games started with, for all bodies at once
+	def step(self, dt):
+		self.pos, self.vel = self.integrator.advance(self.pos, self.vel, self.t, dt, self.accelerations)
+		self.t += dt
+
+	def energy(self):
+		return integrators.energy(self.pos, self.vel, self.mass, Game.G)
+
+	def angular_momentum(self):
+		return integrators.angular_momentum(self.pos, self.vel, self.mass)
+
+
+# massless test particles integrated as one batch in the field of the planets, with no back-reaction;
+# planets(t) gives the planet positions at any time inside the step
+class Swarm:
+	COLOR = (255, 255, 255)
+
+	def __init__(self, pos, vel, integrator="euler"):
+		self.pos = np.asarray(pos, dtype=float).reshape(-1, 2)
+		self.vel = np.asarray(vel, dtype=float).reshape(-1, 2)
+		self.integrator = integrators.INTEGRATORS[integrator]()
+
+	def __len__(self):
+		return len(self.pos)
+
+	@staticmethod
+	def field(planets, mass):
+		def acc(pos, t):
+			d = planets(t)[None, :, :] - pos[:, None, :]
+			r2 = (d ** 2).sum(-1)
+			return Game.G * np.einsum("ijk,ij->ik", d, mass / (r2 * np.sqrt(r2)))
+		return acc
+
+	def step(self, planets, mass, t0, dt):
+		self.pos, self.vel = self.integrator.advance(self.pos, self.vel, t0, dt, self.field(planets, mass))
+
+	def speed(self):
+		return np.sqrt((self.vel ** 2).sum(1))
+
+	def draw(self, game):
+		screen_pos = self.pos * Game.SCALE + (game.Width / 2, game.Height / 2)
+		for x, y in screen_pos.tolist():
+			pygame.draw.circle(game.screen, self.COLOR, (x, y), 1)
+
+
 class Spacecraft:
 
 	ORBIT_DIST = 7000*1000
 	INIT_SPEED = 42*1000
 
-	def __init__(self, x, y, direction_x, direction_y, mass=100000,size = 20):
+	def __init__(self, x, y, direction_x, direction_y, mass=100000,size = 20, integrator="euler"):
 		self.x = x + direction_x * self.ORBIT_DIST
 		self.y = y + direction_y * self.ORBIT_DIST
 		self.x_vel = direction_x * self.INIT_SPEED
 		self.y_vel = direction_y * self.INIT_SPEED 
 		self.mass = mass
-		self.image =  pygame.transform.scale(pygame.image.load("ship.png"), (size, size))
-		self.image_orig = self.image.copy()
-		self.rect = self.image.get_rect()
+		self.size = size
+		self.frames = None
+		self.fly_angle = 0
 		self.off_screen = False
 		self.collided = False
 		self.speed = self.INIT_SPEED
 		self.text = f"speed:{round(self.speed/1000,2)}"
-		self.info = Info(self.text)
+		self.info = None
+		self.integrator = integrators.INTEGRATORS[integrator]()
 
-	def move(self, game):
-		total_force_x = total_force_y = 0
-		for planet in game.planets:
-			force_x, force_y = Planet.attraction(self,planet)
-			total_force_x += force_x
-			total_force_y += force_y
-
-		acceleration_x = total_force_x / self.mass 
-		acceleration_y = total_force_y / self.mass 
-		self.x_vel += acceleration_x * Game.TIMESTEP
-		self.y_vel += acceleration_y * Game.TIMESTEP
+	# sprite and label are created on first draw so headless runs never need a display or font
+	def load_sprite(self):
+		self.frames = sprites.rotations("ship.png", (self.size, self.size))
+		self.info = Info(self.text)
 
-		self.x += self.x_vel * Game.TIMESTEP
-		self.y += self.y_vel * Game.TIMESTEP
+	# one test particle in the planets' field, stepped like a Swarm with the game's integrator
+	def move(self, planets, mass, t0, dt):
+		pos, vel = self.integrator.advance(np.array([[self.x, self.y]]), np.array([[self.x_vel, self.y_vel]]), t0, dt,
+										   Swarm.field(planets, mass))
+		(self.x, self.y), (self.x_vel, self.y_vel) = pos[0].tolist(), vel[0].tolist()
 
 		fly_angle = math.atan2(self.x_vel, self.y_vel)
-		fly_angle = 180+math.degrees(fly_angle)
+		self.fly_angle = 180+math.degrees(fly_angle)
 		self.speed = math.sqrt(self.x_vel**2 + self.y_vel ** 2)
-		self.image = pygame.transform.rotate(self.image_orig, fly_angle)
 
 		self.text = f"speed:{round(self.speed/1000,2)}"
 		
@@ -123,6 +281,10 @@ class Spacecraft:
 		x = self.x * Game.SCALE + game.Width / 2
 		y = self.y * Game.SCALE + game.Height / 2
 
+		if self.frames is None:
+			self.load_sprite()
+		self.image = sprites.frame(self.frames, self.fly_angle)
+		self.rect = self.image.get_rect()
 		self.rect.center = (x, y)
 		game.screen.blit(self.image,self.rect) 
 		self.info.update(self.text, (x,y-20))
@@ -131,12 +293,17 @@ class Spacecraft:
 class Info:
 
 	def __init__(self,text,size=28):
-		self.font = pygame.font.Font(None, size)
-		self.text = self.font.render(text, True, Game.WHITE)
+		self.size = size
+		self.string = text
+		self.text = sprites.text(text, size, Game.WHITE)
 		self.rect = self.text.get_rect()
 
+	# only re-rendered when the displayed string changes
 	def update(self, text, position):
-		self.text = self.font.render(text, True, Game.WHITE)
+		if text != self.string:
+			self.string = text
+			self.text = sprites.text(text, self.size, Game.WHITE)
+			self.rect.size = self.text.get_size()
 		self.rect.center = position
 
 	def draw(self, screen):
@@ -155,22 +322,27 @@ class Game:
 	RED = (188, 39, 50)
 	DARK_GREY = (80, 78, 81)
 
-	def __init__(self, Width=1000, Height=1000):
-		pygame.init()
+	def __init__(self, Width=1000, Height=1000, headless=False, integrator="euler"):
 		self.Width = Width
 		self.Height = Height
-		self.screen = pygame.display.set_mode((Width, Height))
-		pygame.display.set_caption("solar system")
 		self.FPS = 60
-		self.BG = pygame.transform.scale(pygame.image.load("BG.png"), (Width, Height))
+		if not headless:
+			pygame.init()
+			self.screen = pygame.display.set_mode((Width, Height))
+			pygame.display.set_caption("solar system")
+			assets.preload(("BG.png", (Width, Height), False), "Planet.png", "ship.png")
+			self.BG = assets.get("BG.png", (Width, Height), alpha=False)
+			self.clock = pygame.time.Clock()
 		self.ships = []
+		self.swarms = []
 		self.running = True
-		self.clock = pygame.time.Clock()
 		self.click_count = 0
 		self.first_pos = None
 		self.mouse_pos = None
+		self.integrator = integrator
 		self.setup_planets()
 
+	# the planets are the first rows of self.bodies; extra bodies such as asteroids live only in the arrays
 	def setup_planets(self):
 		sun = Planet(x=0, y=0, x_vel=0, y_vel=0, color = Game.YELLOW, 
 			   is_sun = True, radius = 30, mass = 1.98892 * 10**30)
@@ -184,6 +356,72 @@ class Game:
 				 is_sun = False, radius = 14, mass = 4.8685 * 10**24)
 
 		self.planets = [sun, earth, mars, mercury, venus]
+		self.bodies = Bodies.from_planets(self.planets)
+		self.bodies.integrator = integrators.INTEGRATORS[self.integrator]()
+		self.ephemeris = None
+		self.reset_diagnostics()
+
+	# precompute (or load from the cache directory) the planet trajectories for the next steps steps;
+	# while it covers the current time the planets are played back instead of integrated
+	def use_ephemeris(self, steps, directory="ephemeris"):
+		planets = self.bodies.copy(slice(0, len(self.planets)))
+		self.ephemeris = Ephemeris.load_or_build(planets, Game.TIMESTEP, steps, Game.G, directory)
+
+	# model state for checkpoint.py: json meta and named arrays. the ephemeris is not saved, a restored
+	# game integrates live until use_ephemeris is called again
+	def state(self):
+		bodies = self.bodies
+		meta = {"t": bodies.t, "h": getattr(bodies.integrator, "h", None), "swarms": len(self.swarms),
+				"initial": [float(self.initial_energy), float(self.initial_angular_momentum)]}
+		arrays = {"bodies.pos": bodies.pos, "bodies.vel": bodies.vel, "bodies.mass": bodies.mass,
+				  "ships": np.array([[ship.x, ship.y, ship.x_vel, ship.y_vel] for ship in self.ships]).reshape(-1, 4)}
+		for i, planet in enumerate(self.planets):
+			arrays[f"trail{i}"] = planet.orbit.ordered(planet.orbit.points)
+		for i, swarm in enumerate(self.swarms):
+			arrays[f"swarm{i}.pos"], arrays[f"swarm{i}.vel"] = swarm.pos, swarm.vel
+		return meta, arrays
+
+	def restore(self, meta, arrays):
+		bodies = self.bodies
+		bodies.pos, bodies.vel, bodies.mass = (np.array(arrays["bodies." + name]) for name in ["pos", "vel", "mass"])
+		bodies.t = meta["t"]
+		if hasattr(bodies.integrator, "h"):
+			bodies.integrator.h = meta["h"]
+		for i, planet in enumerate(self.planets):
+			planet.x, planet.y = bodies.pos[i].tolist()
+			planet.x_vel, planet.y_vel = bodies.vel[i].tolist()
+			planet.orbit.load(arrays[f"trail{i}"])
+		self.swarms = [Swarm(arrays[f"swarm{i}.pos"], arrays[f"swarm{i}.vel"], self.integrator) for i in range(meta["swarms"])]
+		self.ships = []
+		for x, y, x_vel, y_vel in np.asarray(arrays["ships"]).tolist():
+			ship = Spacecraft(x, y, 0, 0, integrator=self.integrator)
+			ship.x_vel, ship.y_vel = x_vel, y_vel
+			ship.speed = math.sqrt(x_vel ** 2 + y_vel ** 2)
+			ship.text = f"speed:{round(ship.speed/1000,2)}"
+			self.ships.append(ship)
+		self.ephemeris = None
+		self.initial_energy, self.initial_angular_momentum = meta["initial"]
+
+	def reset_diagnostics(self):
+		self.initial_energy = self.bodies.energy()
+		self.initial_angular_momentum = self.bodies.angular_momentum()
+
+	# relative energy and angular momentum drift of the bodies since setup
+	def diagnostics(self):
+		return {"energy_drift": float(integrators.drift(self.bodies.energy(), self.initial_energy)),
+				"angular_momentum_drift": float(integrators.drift(self.bodies.angular_momentum(), self.initial_angular_momentum))}
+
+	# a belt of small bodies on circular orbits around the sun
+	def add_asteroids(self, num, inner=2.2, outer=3.2, mass=1e15):
+		sun = self.planets[0]
+		radius = np.random.uniform(inner, outer, num) * Game.AU
+		angle = np.random.uniform(0, 2 * np.pi, num)
+		speed = np.sqrt(Game.G * sun.mass / radius)
+		direction = np.column_stack([np.cos(angle), np.sin(angle)])
+		pos = np.array([sun.x, sun.y]) + direction * radius[:, None]
+		vel = np.array([sun.x_vel, sun.y_vel]) + direction[:, ::-1] * np.array([-1, 1]) * speed[:, None]
+		self.bodies.add(pos, vel, np.full(num, mass))
+		self.reset_diagnostics()
 
 
 	def create_ship(self, location, mouse_loc):
@@ -192,9 +430,21 @@ class Game:
 		pos_x = self.planets[1].x
 		pos_y = self.planets[1].y
 
-		ship = Spacecraft(pos_x, pos_y,direction_x,direction_y)
+		ship = Spacecraft(pos_x, pos_y,direction_x,direction_y, integrator=self.integrator)
 		self.ships.append(ship)
 
+	# a monte-carlo fan of test particles launched from earth like create_ship, with launch angles spread
+	# uniformly over +-spread/2 radians and speeds over +-speed_spread of Spacecraft.INIT_SPEED
+	def create_swarm(self, location, mouse_loc, num=1000, spread=0.2, speed_spread=0.1):
+		direction = (pygame.math.Vector2(mouse_loc)- pygame.math.Vector2(location)).normalize()
+		angle = math.atan2(direction.y, direction.x) + np.random.uniform(-spread / 2, spread / 2, num)
+		speed = Spacecraft.INIT_SPEED * (1 + np.random.uniform(-speed_spread, speed_spread, num))
+		unit = np.column_stack([np.cos(angle), np.sin(angle)])
+		pos = np.array([self.planets[1].x, self.planets[1].y]) + unit * Spacecraft.ORBIT_DIST
+		swarm = Swarm(pos, unit * speed[:, None], self.integrator)
+		self.swarms.append(swarm)
+		return swarm
+
 
 	def get_input(self):
 		self.mouse_pos = pygame.mouse.get_pos()
@@ -209,28 +459,63 @@ class Game:
 				if self.click_count == 1:
 					self.first_pos = self.mouse_pos
 				if self.click_count == 2:
-					self.create_ship(self.first_pos, self.mouse_pos)
+					if pygame.key.get_mods() & pygame.KMOD_SHIFT:
+						self.create_swarm(self.first_pos, self.mouse_pos)
+					else:
+						self.create_ship(self.first_pos, self.mouse_pos)
 					
 
 	def draw(self):
 		self.screen.blit(self.BG,(0,0))
 		for planet in self.planets:
 			planet.draw(self)
+		screen_pos = self.bodies.pos[len(self.planets):] * Game.SCALE + (self.Width / 2, self.Height / 2)
+		for x, y in screen_pos.tolist():
+			pygame.draw.circle(self.screen, self.WHITE, (x, y), 1)
 		if self.click_count == 1:
 			pygame.draw.line(self.screen, self.WHITE, self.first_pos,self.mouse_pos)
 		
 		for ship in self.ships:
 			ship.draw(self)
+		for swarm in self.swarms:
+			swarm.draw(self)
 
 		pygame.display.update()
 
 
-	def update(self):
-		for planet in self.planets:
-			planet.move(self.planets)
+	def step(self):
+		num = len(self.planets)
+		t0 = self.bodies.t
+		dt = Game.TIMESTEP
+		mass = self.bodies.mass[:num]
+		if self.ephemeris is not None and t0 + dt <= self.ephemeris.end:
+			# planets come from the ephemeris, any other bodies are carried along as test particles
+			planets = self.ephemeris.positions
+			pos, vel = self.ephemeris.state(t0 + dt)
+			if len(self.bodies) > num:
+				extra_pos, extra_vel = self.bodies.integrator.advance(self.bodies.pos[num:], self.bodies.vel[num:], t0, dt,
+																	 Swarm.field(planets, mass))
+				pos, vel = np.concatenate([pos, extra_pos]), np.concatenate([vel, extra_vel])
+			self.bodies.pos, self.bodies.vel = pos, vel
+			self.bodies.t = t0 + dt
+		else:
+			before = self.bodies.pos[:num].copy()
+			self.bodies.step(dt)
+			after = self.bodies.pos[:num].copy()
+			planets = lambda t: before + (after - before) * ((t - t0) / dt)
+
+		for swarm in self.swarms:
+			swarm.step(planets, mass, t0, dt)
+		for planet, (x, y), (x_vel, y_vel) in zip(self.planets, self.bodies.pos.tolist(), self.bodies.vel.tolist()):
+			planet.x, planet.y = x, y
+			planet.x_vel, planet.y_vel = x_vel, y_vel
+			planet.orbit.append((x, y))
 
 		for ship in self.ships:
-			ship.move(self)
+			ship.move(planets, mass, t0, dt)
+
+	def update(self):
+		self.step()
 
 
 	def play(self):
@@ -3,36 +3,131 @@
 import pygame
 import random
 import numpy as np
-from util import plot_hist
+from collections.abc import Mapping
+from metrics import Metrics, PrintSink, LivePlotSink
 
+def cell_field(name):
+	def get(self):
+		return getattr(self.grid, name)[self.x, self.y].item()
+
+	def set(self, value):
+		getattr(self.grid, name)[self.x, self.y] = value
+
+	return property(get, set)
+
+
+# view of one cell of the grid arrays, kept so grid.cells[(x,y)].sugar style access still works
 class Cell:
+	sugar = cell_field("sugar")
+	capacity = cell_field("capacity")
+
+	@property
+	def occupied(self):
+		return self.grid.occupied[self.x, self.y].item()
+
+	@occupied.setter
+	def occupied(self, value):
+		if value:
+			self.grid.occupy(self.x, self.y)
+		else:
+			self.grid.vacate(self.x, self.y)
 
-	def __init__(self,pos,init_sugar):
+	def __init__(self,grid,pos):
+		self.grid = grid
 		self.x,self.y = pos
-		self.capacity = init_sugar
-		self.sugar = init_sugar
-		self.occupied = False
 
 	def grow(self):
 		if self.sugar < self.capacity:
 			self.sugar += 1
 
+
+# set of free cells as a permutation of flat indices: cells[:size] are free, position is the inverse,
+# so add, remove and sampling k cells are all O(1) per cell
+class FreeCells:
+	def __init__(self, size):
+		self.cells = np.arange(size)
+		self.position = np.arange(size)
+		self.size = size
+
+	def __len__(self):
+		return self.size
+
+	def __contains__(self, cell):
+		return self.position[cell] < self.size
+
+	def swap(self, i, j):
+		a, b = self.cells[i], self.cells[j]
+		self.cells[i], self.cells[j] = b, a
+		self.position[a], self.position[b] = j, i
+
+	def add(self, cell):
+		if cell not in self:
+			self.swap(self.position[cell], self.size)
+			self.size += 1
+
+	def remove(self, cell):
+		if cell in self:
+			self.size -= 1
+			self.swap(self.position[cell], self.size)
+
+	# k distinct free cells by a partial Fisher-Yates shuffle of the free region
+	def sample(self, k):
+		k = min(k, self.size)
+		for i in range(k):
+			self.swap(i, np.random.randint(i, self.size))
+		return self.cells[:k].copy()
+
+
+class Cells(Mapping):
+	def __init__(self, grid):
+		self.grid = grid
+
+	def __getitem__(self, pos):
+		x, y = pos
+		if not (0 <= x < self.grid.grid_width and 0 <= y < self.grid.grid_height):
+			raise KeyError(pos)
+		return Cell(self.grid, (x, y))
+
+	def __iter__(self):
+		for x in range(self.grid.grid_width):
+			for y in range(self.grid.grid_height):
+				yield (x, y)
+
+	def __len__(self):
+		return self.grid.grid_width * self.grid.grid_height
+
+def agent_field(name):
+	def get(self):
+		return getattr(self.population, name)[self.index].item()
+
+	def set(self, value):
+		getattr(self.population, name)[self.index] = value
+
+	return property(get, set)
+
+
+# thin view of one row of a Population, used for drawing and debugging
 class Agent:
 	Color = (188, 39, 50)
-	def __init__(self,x,y,tile_size):
-		self.x = x
-		self.y = y
-		self.tile_size = tile_size
-		self.reset()
+	x = agent_field("x")
+	y = agent_field("y")
+	sugar = agent_field("sugar")
+	metabolism = agent_field("metabolism")
+	vision = agent_field("vision")
+	life = agent_field("life")
+	died = agent_field("died")
+
+	def __init__(self,population,index):
+		self.population = population
+		self.index = index
+		self.tile_size = population.tile_size
+		self.neighbors = {}
+		self.target = None
 
 	def reset(self):
-		self.sugar = random.randrange(5,25)
-		self.metabolism = random.randrange(1,4)
-		self.vision = random.randrange(1,6)
+		self.population.reset([self.index])
 		self.neighbors = {}
 		self.target = None
-		self.died = False
-		self.life = random.randrange(60,100)
 
 	#  agent surveys k cells in each of the 4 compass directions, where k isthe range of the agent’s vision
 	def survey(self,grid):
@@ -42,15 +137,15 @@ class Agent:
 		for dx in dx_list:
 			if self.x + dx < 0 or self.x + dx >=grid.grid_width:
 				continue
-			self.neighbors[(self.x + dx, self.y)] = {'sugar': grid.cells[self.x + dx, self.y].sugar, 
-													'occupied': grid.cells[self.x + dx, self.y].occupied,
+			self.neighbors[(self.x + dx, self.y)] = {'sugar': grid.sugar[self.x + dx, self.y], 
+													'occupied': grid.occupied[self.x + dx, self.y],
 													'distance': abs(dx)} 
 
 		for dy in dx_list:
 			if self.y + dy < 0 or self.y + dy >=grid.grid_height:
 				continue
-			self.neighbors[(self.x, self.y + dy)] = {'sugar': grid.cells[self.x, self.y + dy].sugar,
-													'occupied': grid.cells[self.x, self.y + dy].occupied,
+			self.neighbors[(self.x, self.y + dy)] = {'sugar': grid.sugar[self.x, self.y + dy],
+													'occupied': grid.occupied[self.x, self.y + dy],
 													'distance': abs(dy)}
 
 
@@ -73,18 +168,18 @@ class Agent:
 
 	# moves to the selected cell and harvests the sugar, adding the harvest to its accumulated wealth and leaving the cell empty
 	def move(self,grid):
-		grid.cells[(self.x, self.y)].occupied = False
+		grid.vacate(self.x, self.y)
 		self.x, self.y = self.target
-		self.sugar += grid.cells[self.target].sugar
-		grid.cells[self.target].sugar = 0
-		grid.cells[self.target].occupied = True
+		self.sugar += grid.sugar[self.target].item()
+		grid.sugar[self.target] = 0
+		grid.occupy(*self.target)
 
 	def consume(self,grid):
 		self.sugar -= self.metabolism
 		self.life -= 1
 		if self.sugar <= 0 or self.life <= 0:
 			self.died = True
-			grid.cells[(self.x, self.y)].occupied = False
+			grid.vacate(self.x, self.y)
 
 	def update(self, grid):
 		self.choose(grid)
@@ -96,6 +191,123 @@ class Agent:
 		pygame.draw.circle(screen, self.Color, center = (self.x*self.tile_size+radius, self.y*self.tile_size+radius),radius= radius)
 
 
+# struct-of-arrays agent population: one numpy array per attribute, agent i is row i
+class Population:
+
+	def __init__(self, tile_size):
+		self.tile_size = tile_size
+		self.x = np.zeros(0, dtype=np.int64)
+		self.y = np.zeros(0, dtype=np.int64)
+		self.sugar = np.zeros(0, dtype=np.int64)
+		self.metabolism = np.zeros(0, dtype=np.int64)
+		self.vision = np.zeros(0, dtype=np.int64)
+		self.life = np.zeros(0, dtype=np.int64)
+		self.died = np.zeros(0, dtype=bool)
+		self.agents = []
+
+	def __len__(self):
+		return len(self.x)
+
+	def add(self, xs, ys):
+		start = len(self)
+		num = len(xs)
+		self.x = np.concatenate([self.x, np.asarray(xs, dtype=np.int64)])
+		self.y = np.concatenate([self.y, np.asarray(ys, dtype=np.int64)])
+		for name in ["sugar", "metabolism", "vision", "life"]:
+			setattr(self, name, np.concatenate([getattr(self, name), np.zeros(num, dtype=np.int64)]))
+		self.died = np.concatenate([self.died, np.zeros(num, dtype=bool)])
+		self.reset(np.arange(start, start + num))
+		self.agents.extend(Agent(self, i) for i in range(start, start + num))
+
+	def reset(self, index):
+		num = len(index)
+		self.sugar[index] = np.random.randint(5, 25, num)
+		self.metabolism[index] = np.random.randint(1, 4, num)
+		self.vision[index] = np.random.randint(1, 6, num)
+		self.life[index] = np.random.randint(60, 100, num)
+		self.died[index] = False
+
+	def consume(self, grid):
+		self.sugar -= self.metabolism
+		self.life -= 1
+		self.died = (self.sugar <= 0) | (self.life <= 0)
+		for x, y in zip(self.x[self.died].tolist(), self.y[self.died].tolist()):
+			grid.vacate(x, y)
+
+	# dead agents are reborn with fresh attributes on distinct random free cells
+	def respawn(self, grid):
+		dead = np.flatnonzero(self.died)
+		if len(dead) == 0:
+			return
+		cells = grid.free.sample(len(dead))
+		dead = dead[:len(cells)]
+		self.x[dead], self.y[dead] = np.divmod(cells, grid.grid_height)
+		for x, y in zip(self.x[dead].tolist(), self.y[dead].tolist()):
+			grid.occupy(x, y)
+		self.reset(dead)
+
+	# same rule as Agent.choose + Agent.move, run for every agent in random order over flat python lists.
+	# rays are scanned from near to far in survey order, so ties are broken exactly like Agent.choose
+	def move(self, grid):
+		h = grid.grid_height
+		sugar = grid.sugar.ravel().tolist()
+		occupied = grid.occupied.ravel().tolist()
+		xs = self.x.tolist()
+		ys = self.y.tolist()
+		vision = self.vision.tolist()
+		gain = [0] * len(xs)
+		moves = []
+		choice = random.choice
+
+		for i in np.random.permutation(len(xs)).tolist():
+			x, y = xs[i], ys[i]
+			here = x * h + y
+			limits = (x, grid.grid_width - 1 - x, y, h - 1 - y)
+			best = -1
+			best_distance = 0
+			candidates = []
+			for distance, direction, offset in grid.ray_table(vision[i]):
+				if distance > limits[direction]:
+					continue
+				cell = here + offset
+				if occupied[cell]:
+					continue
+				value = sugar[cell]
+				if value > best:
+					best, best_distance, candidates = value, distance, [cell]
+				elif value == best and distance == best_distance:
+					candidates.append(cell)
+
+			target = choice(candidates) if candidates else here
+			occupied[here] = False
+			gain[i] += sugar[target]
+			sugar[target] = 0
+			occupied[target] = True
+			xs[i], ys[i] = divmod(target, h)
+			moves.append((here, target))
+
+		self.x = np.array(xs, dtype=np.int64)
+		self.y = np.array(ys, dtype=np.int64)
+		self.sugar += np.array(gain, dtype=np.int64)
+		grid.sugar[:] = np.array(sugar, dtype=grid.sugar.dtype).reshape(grid.sugar.shape)
+		grid.occupied[:] = np.array(occupied, dtype=bool).reshape(grid.occupied.shape)
+		# replay the moves in order so the free-cell index ends up in the same layout as with Agent.move
+		free = grid.free
+		for here, target in moves:
+			free.add(here)
+			free.remove(target)
+
+	# agents move one at a time in random order, then eat, die and respawn together
+	def update(self, grid):
+		self.move(grid)
+		self.consume(grid)
+		self.respawn(grid)
+
+	def stats(self):
+		min_value, per_25, per_50, per_75, max_value = np.percentile(self.sugar, [0, 25, 50, 75, 100]).tolist()
+		return {"pop_size": len(self), "min": min_value, "p25": per_25, "p50": per_50, "p75": per_75, "max": max_value}
+
+
 
 class Grid:
 	Color = [(255,255,214),(254,227,153),(254,203,123),(253,176,104)]
@@ -103,26 +315,42 @@ class Grid:
 		self.grid_width = grid_width
 		self.grid_height = grid_height
 		self.tile_size = tile_size
-		self.cells = {}
+		self.cells = Cells(self)
+		self.rays = {}
 		self.reset_cells()
 
+	# the landscape is three (grid_width, grid_height) arrays indexed [x, y]
 	def reset_cells(self):
 		center1 = [self.grid_width//4, self.grid_height//4]
 		center2 = [self.grid_width * 3//4, self.grid_height *3//4]
-		self.cells = {}
-		for x in range(self.grid_width):
-			for y in range(self.grid_height):
-				if (self.distance((x,y), center1) < 5 or 
-					self.distance((x,y), center2) < 5):
-					self.cells[(x,y)] = Cell((x,y),3)
-				elif (self.distance((x,y), center1) < 10 or 
-					self.distance((x,y), center2) < 10):
-					self.cells[(x,y)] = Cell((x,y),2)
-				elif (self.distance((x,y), center1) < 15 or 
-					self.distance((x,y), center2) < 15):
-					self.cells[(x,y)] = Cell((x,y),1)
-				else:
-					self.cells[(x,y)] = Cell((x,y),0)
+		xs, ys = np.indices((self.grid_width, self.grid_height))
+		distance = np.minimum(self.distance((xs, ys), center1), self.distance((xs, ys), center2))
+		self.capacity = np.select([distance < 5, distance < 10, distance < 15], [3, 2, 1], 0)
+		self.sugar = self.capacity.copy()
+		self.occupied = np.zeros((self.grid_width, self.grid_height), dtype=bool)
+		self.free = FreeCells(self.grid_width * self.grid_height)
+
+	def occupy(self, x, y):
+		self.occupied[x, y] = True
+		self.free.remove(x * self.grid_height + y)
+
+	def vacate(self, x, y):
+		self.occupied[x, y] = False
+		self.free.add(x * self.grid_height + y)
+
+	def grow(self):
+		np.minimum(self.sugar + 1, self.capacity, out=self.sugar)
+
+	# (distance, direction, flat offset) for every cell an agent with this vision surveys, nearest first;
+	# direction 0..3 is -x, +x, -y, +y
+	def ray_table(self, vision):
+		table = self.rays.get(vision)
+		if table is None:
+			h = self.grid_height
+			table = [(d, direction, offset) for d in range(1, vision + 1)
+					 for direction, offset in enumerate((-d * h, d * h, -d, d))]
+			self.rays[vision] = table
+		return table
 
 	@staticmethod
 	def distance(pos1, pos2):
@@ -140,62 +368,84 @@ class Grid:
 		return (x * self.tile_size, y * self.tile_size)
 
 	def draw(self, screen):
-		for cell in self.cells:
-			x, y = self.cell2position(cell)
-			pygame.draw.rect(screen, self.Color[self.cells[cell].sugar], (x, y, self.tile_size, self.tile_size))
+		for cell_x, column in enumerate(self.sugar.tolist()):
+			for cell_y, sugar in enumerate(column):
+				x, y = self.cell2position((cell_x, cell_y))
+				pygame.draw.rect(screen, self.Color[sugar], (x, y, self.tile_size, self.tile_size))
 
 class Game:
 	DARK_GREY = (80, 78, 81)
-	def __init__(self, Width=800, Height=800,Tile_size = 10) :
-		pygame.init()
+	FIELDS = ["step", "pop_size", "min", "p25", "p50", "p75", "max"]
+	REPORT = "Step:{step} Pop_size:{pop_size}\nmin:{min}  p25:{p25}  p50:{p50}  p75:{p75}  max:{max}"
+	GRID_ARRAYS = ["sugar", "capacity", "occupied"]
+	POPULATION_ARRAYS = ["x", "y", "sugar", "metabolism", "vision", "life", "died"]
+
+	# sinks receive the per-step statistics; by default a window prints them and plots the sugar histogram
+	def __init__(self, Width=800, Height=800,Tile_size = 10, headless=False, sinks=None, agents=300) :
 		self.Width = Width
 		self.Height = Height
 		self.Tile_size = Tile_size
-		self.screen = pygame.display.set_mode((Width, Height))
-		self.clock = pygame.time.Clock()
+		if not headless:
+			pygame.init()
+			self.screen = pygame.display.set_mode((Width, Height))
+			self.clock = pygame.time.Clock()
 		self.grid = Grid(Width//Tile_size, Height//Tile_size, Tile_size)
 		self.update_freq = 500
 		self.time_passed = 0
 		self.running = True
 		self.pause = True
 		self.FPS = 60
-		self.step = 0
-		self.reset_agents()
+		self.steps = 0
+		if sinks is None:
+			sinks = [] if headless else [PrintSink(self.REPORT), LivePlotSink()]
+		self.metrics = Metrics(self.FIELDS, sinks)
+		self.num_agents = agents
+		self.reset_agents(agents)
+
+	@property
+	def agents(self):
+		return self.population.agents
 
 	def reset_agents(self,num=300):
-		self.agents = []
-		self.pos = set([(random.randrange(0, self.Width//self.Tile_size), random.randrange(0, self.Height//self.Tile_size)) 
-							for _ in range(num)])
-		for x,y in self.pos:
-			self.agents.append(Agent(x,y,self.Tile_size))
-			self.grid.cells[(x,y)].occupied = True
+		self.population = Population(self.Tile_size)
+		xs, ys = np.divmod(self.grid.free.sample(num), self.grid.grid_height)
+		self.pos = set(zip(xs.tolist(), ys.tolist()))
+		self.population.add(xs, ys)
+		for x, y in self.pos:
+			self.grid.occupy(x, y)
+
+	# model state for checkpoint.py: json meta and named arrays
+	def state(self):
+		grid, population = self.grid, self.population
+		arrays = {"grid." + name: getattr(grid, name) for name in self.GRID_ARRAYS}
+		arrays.update({"population." + name: getattr(population, name) for name in self.POPULATION_ARRAYS})
+		arrays.update({"free.cells": grid.free.cells, "free.position": grid.free.position})
+		return {"steps": self.steps, "free_size": grid.free.size}, arrays
+
+	def restore(self, meta, arrays):
+		self.steps = meta["steps"]
+		for name in self.GRID_ARRAYS:
+			setattr(self.grid, name, np.array(arrays["grid." + name]))
+		self.grid.free.cells = np.array(arrays["free.cells"])
+		self.grid.free.position = np.array(arrays["free.position"])
+		self.grid.free.size = meta["free_size"]
+		self.population = Population(self.Tile_size)
+		for name in self.POPULATION_ARRAYS:
+			setattr(self.population, name, np.array(arrays["population." + name]))
+		self.population.agents = [Agent(self.population, i) for i in range(len(self.population))]
+
+	def step(self):
+		self.steps += 1
+		self.population.update(self.grid)
+		self.grid.grow()
+		self.metrics.record({"step": self.steps, **self.population.stats()}, self.population.sugar)
 
 	def update(self):
 		if not self.pause:
 			self.time_passed += self.clock.tick(self.FPS)
 			if self.time_passed > self.update_freq:
 				self.time_passed = 0
-				self.step += 1
-
-				random.shuffle(self.agents)
-				for agent in self.agents:
-					agent.update(self.grid)
-					if agent.died:
-						agent.x, agent.y = random.choice([cell for cell in self.grid.cells 
-									   			if self.grid.cells[cell].occupied==False])
-						agent.reset()
-						#self.agents.remove(agent)
-				
-				for cell in self.grid.cells:
-					self.grid.cells[cell].grow()
-				sugar_arr = np.array([agent.sugar for agent in self.agents])
-				max_value = sugar_arr.max()
-				min_value = sugar_arr.min()
-				per_25 = np.percentile(sugar_arr, 25)
-				per_50 = np.percentile(sugar_arr, 50)
-				per_75 = np.percentile(sugar_arr, 75)
-				plot_hist(sugar_arr)
-				print(f"Step:{self.step} Pop_size:{len(sugar_arr)}\nmin:{min_value}  p25:{per_25}  p50:{per_50}  p75:{per_75}  max:{max_value}")
+				self.step()
 
 
 	def draw(self):
@@ -207,7 +457,7 @@ class Game:
 		# 	pygame.draw.line(self.screen, Game.DARK_GREY, (col * self.Tile_size, 0), (col * self.Tile_size, self.Height))
 		# for row in range(self.grid.grid_height):
 		# 	pygame.draw.line(self.screen, Game.DARK_GREY, (0,row * self.Tile_size), (self.Width,row * self.Tile_size))
-		
+		self.metrics.poll(self.screen)
 		pygame.display.update()
 
 	def get_input(self):
@@ -223,9 +473,9 @@ class Game:
 					self.pause = True
 				
 				if event.key == pygame.K_r:
-					self.step = 0
+					self.steps = 0
 					self.grid.reset_cells()
-					self.reset_agents()
+					self.reset_agents(self.num_agents)
 
 	def play(self):
 
@@ -235,6 +485,7 @@ class Game:
 			self.update()
 			self.draw()
 			
+		self.metrics.close()
 		pygame.quit()
 
 if __name__ == "__main__":
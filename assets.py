@@ -0,0 +1,57 @@
+# shared image loader: every png is read from disk once and every scaled variant is built once.
+# once a display exists, cached variants are converted to its pixel format so blits skip the conversion
+
+import os
+import pygame
+
+# relative paths are looked up here, not in the working directory, so the games run from anywhere
+directory = os.path.dirname(os.path.abspath(__file__))
+files = {}
+variants = {}
+registered = False
+
+
+# converted variants belong to the display they were converted for, so nothing is kept past pygame.quit()
+def clear():
+	global registered
+	files.clear()
+	variants.clear()
+	registered = False
+
+
+# register_quit callbacks only run once, see sprites.register
+def register():
+	global registered
+	if not registered:
+		pygame.register_quit(clear)
+		registered = True
+
+
+def load(path):
+	if path not in files:
+		register()
+		files[path] = pygame.image.load(os.path.join(directory, path))
+	return files[path]
+
+
+# path scaled to size (None keeps the file's size); alpha=False drops the alpha channel for opaque backgrounds
+def get(path, size=None, alpha=True):
+	key = (path, None if size is None else tuple(size), alpha)
+	image = variants.get(key)
+	if image is None:
+		image = load(path)
+		if size is not None:
+			image = pygame.transform.scale(image, size)
+		# without a display there is no pixel format to convert to, so the variant is not cached yet
+		if pygame.display.get_surface() is None:
+			return image
+		image = variants[key] = image.convert_alpha() if alpha else image.convert()
+	return image
+
+
+# entries are paths or (path, size) / (path, size, alpha) tuples, loaded ahead of the first frame
+def preload(*entries):
+	for entry in entries:
+		if isinstance(entry, str):
+			entry = (entry,)
+		get(*entry)
@@ -0,0 +1,144 @@
+# Barnes-Hut quadtree gravity: O(n log n) approximate accelerations with opening angle theta
+#   python barnes_hut.py   prints an accuracy vs speed report against direct summation
+
+import time
+import numpy as np
+
+
+class Tree:
+
+	def __init__(self, pos, mass, leaf_size=16):
+		self.pos = pos
+		self.mass = mass
+		self.leaf_size = leaf_size
+		self.order = np.arange(len(mass))
+		self.com = []
+		self.node_mass = []
+		self.size = []
+		self.start = []
+		self.count = []
+		self.children = []
+
+		lo = pos.min(0)
+		size = float((pos.max(0) - lo).max()) * 1.0001 + 1e-9
+		self.make(0, len(mass), lo[0], lo[1], size)
+
+		self.com = np.array(self.com)
+		self.node_mass = np.array(self.node_mass)
+		self.size = np.array(self.size)
+		self.start = np.array(self.start)
+		self.count = np.array(self.count)
+		self.children = np.array(self.children)
+		self.leaf = (self.children < 0).all(1)
+
+	# node covering order[start:start+count], a square of side size with lower corner (x0, y0)
+	def make(self, start, count, x0, y0, size, depth=0):
+		node = len(self.size)
+		members = self.order[start:start + count]
+		mass = self.mass[members]
+		total = mass.sum()
+		if total > 0:
+			com = (self.pos[members] * mass[:, None]).sum(0) / total
+		else:
+			com = np.array([x0 + size / 2, y0 + size / 2])
+		self.com.append(com)
+		self.node_mass.append(total)
+		self.size.append(size)
+		self.start.append(start)
+		self.count.append(count)
+		self.children.append([-1, -1, -1, -1])
+
+		# coincident particles would split forever, so depth is capped
+		if count <= self.leaf_size or depth >= 48:
+			return node
+
+		half = size / 2
+		points = self.pos[members]
+		quadrant = (points[:, 0] >= x0 + half) + 2 * (points[:, 1] >= y0 + half)
+		sort = np.argsort(quadrant, kind="stable")
+		self.order[start:start + count] = members[sort]
+		counts = np.bincount(quadrant, minlength=4)
+		offset = start
+		for q in range(4):
+			if counts[q]:
+				self.children[node][q] = self.make(offset, counts[q], x0 + half * (q & 1), y0 + half * (q >> 1), half, depth + 1)
+			offset += counts[q]
+		return node
+
+
+def add_pairwise(acc, targets, sources, pos, mass, G):
+	d = pos[sources] - pos[targets]
+	r2 = (d ** 2).sum(1)
+	r2[targets == sources] = np.inf
+	w = G * mass[sources] / (r2 * np.sqrt(r2))
+	acc[:, 0] += np.bincount(targets, weights=d[:, 0] * w, minlength=len(acc))
+	acc[:, 1] += np.bincount(targets, weights=d[:, 1] * w, minlength=len(acc))
+
+
+# breadth-first tree walk vectorized over (particle, node) pairs
+def accelerations(pos, mass, G, theta=0.5, leaf_size=16):
+	n = len(mass)
+	tree = Tree(pos, mass, leaf_size)
+	acc = np.zeros_like(pos)
+	particles = np.arange(n)
+	nodes = np.zeros(n, dtype=np.int64)
+
+	while len(particles):
+		d = tree.com[nodes] - pos[particles]
+		r2 = (d ** 2).sum(1)
+		far = tree.size[nodes] ** 2 < theta ** 2 * r2
+
+		# far nodes act as a point mass at their centre of mass
+		p, m, dd, rr = particles[far], nodes[far], d[far], r2[far]
+		w = G * tree.node_mass[m] / (rr * np.sqrt(rr))
+		acc[:, 0] += np.bincount(p, weights=dd[:, 0] * w, minlength=n)
+		acc[:, 1] += np.bincount(p, weights=dd[:, 1] * w, minlength=n)
+
+		# near leaves are summed directly against their members
+		near = ~far & tree.leaf[nodes]
+		p, m = particles[near], nodes[near]
+		counts = tree.count[m]
+		targets = np.repeat(p, counts)
+		first = np.repeat(tree.start[m] - np.cumsum(counts) + counts, counts)
+		sources = tree.order[first + np.arange(len(targets))]
+		add_pairwise(acc, targets, sources, pos, mass, G)
+
+		# near internal nodes are opened
+		open_ = ~far & ~tree.leaf[nodes]
+		children = tree.children[nodes[open_]].reshape(-1)
+		particles = np.repeat(particles[open_], 4)
+		keep = children >= 0
+		particles, nodes = particles[keep], children[keep]
+
+	return acc
+
+
+def report(sizes=(1000, 4000, 16000), thetas=(0.3, 0.5, 0.8, 1.0), G=6.67428e-11, seed=0):
+	from SolarSystem import accelerations as direct
+	rng = np.random.default_rng(seed)
+	# errors are |a_bh - a_direct| / |a_direct| per body; the last column divides by the rms |a_direct| instead,
+	# since bodies near the centre of the disk feel almost no net force
+	print(f"{'n':>7} {'theta':>6} {'bh s':>9} {'direct s':>9} {'speedup':>8} {'median err':>11} {'p99 err':>9} {'max/rms':>9}")
+	for n in sizes:
+		radius = np.sqrt(rng.uniform(0, 1, n)) * 3e11
+		angle = rng.uniform(0, 2 * np.pi, n)
+		pos = np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+		mass = rng.uniform(1e20, 1e23, n)
+
+		start = time.perf_counter()
+		exact = direct(pos, mass, G)
+		direct_time = time.perf_counter() - start
+		norm = np.linalg.norm(exact, axis=1)
+		rms = np.sqrt((norm ** 2).mean())
+
+		for theta in thetas:
+			start = time.perf_counter()
+			approx = accelerations(pos, mass, G, theta)
+			bh_time = time.perf_counter() - start
+			error = np.linalg.norm(approx - exact, axis=1)
+			print(f"{n:>7} {theta:>6} {bh_time:>9.3f} {direct_time:>9.3f} {direct_time / bh_time:>8.2f} "
+				  f"{np.median(error / norm):>11.2e} {np.percentile(error / norm, 99):>9.2e} {error.max() / rms:>9.2e}")
+
+
+if __name__ == "__main__":
+	report()
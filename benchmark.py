@@ -0,0 +1,145 @@
+# benchmark every model's step() headless over a sweep of problem sizes and write a json report
+#   python benchmark.py --out before.json
+#   python benchmark.py --out after.json --models Sugarscape SolarSystem
+#   python benchmark.py --compare before.json after.json
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+from headless import make_game, MODELS
+
+# Game_Of_Life's own reset() seeds a fixed number of cells per row, which thins out as the board grows, so the
+# benchmark boards are filled at a fixed density from the case seed instead
+def fill(game, density=0.3):
+	grid = game.grid
+	board = np.random.rand(grid.grid_width, grid.grid_height) < density
+	game.restore({}, {"board": board.astype(np.uint8)})
+
+
+# (model, case, size, make_game kwargs, setup) per model; size is the swept problem dimension
+def cases():
+	for engine in ["set", "numpy"]:
+		for size in [64, 128, 256]:
+			yield "Game_Of_Life", engine, size, {"Width": size, "Height": size, "Tile_size": 1, "engine": engine}, fill
+	for engine in ["dict", "array"]:
+		for size in [40, 80, 160]:
+			yield "Models_Of_Segregation", engine, size, {"Width": size, "Height": size, "Tile_size": 1, "engine": engine}, None
+	for agents in [300, 1000, 3000]:
+		yield "Sugarscape", "agents", agents, {"Width": 100, "Height": 100, "Tile_size": 1, "agents": agents}, None
+	for asteroids in [0, 500, 2000]:
+		yield "SolarSystem", "bodies", 5 + asteroids, {}, lambda game, n=asteroids: game.add_asteroids(n) if n else None
+	for ships in [10, 100, 1000]:
+		yield "Gravitational_Slingshot", "ships", ships, {"ships": ships}, None
+
+
+def build(model, seed, kwargs, setup):
+	kwargs = dict(kwargs)
+	ships = kwargs.pop("ships", 0)
+	game = make_game(model, seed, ships, **kwargs)
+	if setup is not None:
+		setup(game)
+	return game
+
+
+# sha1 of the game's checkpoint state, so reports can show that two runs started from the same board
+def digest(game):
+	meta, arrays = game.state()
+	h = hashlib.sha1(json.dumps(meta, sort_keys=True).encode())
+	for name in sorted(arrays):
+		array = np.ascontiguousarray(arrays[name])
+		h.update(f"{name} {array.dtype.str} {array.shape}".encode())
+		h.update(array.tobytes())
+	return h.hexdigest()
+
+
+def measure(model, seed, kwargs, setup, steps, warmup, memory_steps):
+	game = build(model, seed, kwargs, setup)
+	initial = digest(game)
+	for _ in range(warmup):
+		game.step()
+	latency = np.zeros(steps)
+	start = time.perf_counter()
+	for i in range(steps):
+		t = time.perf_counter()
+		game.step()
+		latency[i] = time.perf_counter() - t
+	elapsed = time.perf_counter() - start
+
+	# peak memory comes from a separate, shorter run since tracemalloc slows every allocation down
+	tracemalloc.start()
+	game = build(model, seed, kwargs, setup)
+	for _ in range(memory_steps):
+		game.step()
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	p50, p90, p99 = np.percentile(latency, [50, 90, 99]) * 1000
+	return {"initial_state": initial, "steps": steps, "seconds": elapsed, "steps_per_s": steps / elapsed,
+			"latency_ms": {"p50": p50, "p90": p90, "p99": p99, "max": latency.max() * 1000},
+			"peak_memory_mb": peak / 2 ** 20}
+
+
+def commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+							  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def run(models=MODELS, steps=100, warmup=5, memory_steps=10, seed=0):
+	results = []
+	for model, case, size, kwargs, setup in cases():
+		if model not in models:
+			continue
+		result = {"model": model, "case": case, "size": size, "seed": seed}
+		result.update(measure(model, seed, kwargs, setup, steps, warmup, memory_steps))
+		results.append(result)
+		print(f"{model:<24} {case:<7} {size:>6} {result['steps_per_s']:>10.1f} steps/s "
+			  f"p99 {result['latency_ms']['p99']:>8.2f} ms  peak {result['peak_memory_mb']:>7.1f} MB")
+	meta = {"commit": commit(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+			"numpy": np.__version__, "machine": platform.machine(), "steps": steps, "warmup": warmup, "seed": seed}
+	return {"meta": meta, "results": results}
+
+
+# steps/s of every case present in both reports, as new / old; cases that started from different states are flagged
+def compare(old_path, new_path):
+	with open(old_path) as f:
+		old = {(r["model"], r["case"], r["size"]): r for r in json.load(f)["results"]}
+	with open(new_path) as f:
+		new = json.load(f)["results"]
+	for r in new:
+		key = (r["model"], r["case"], r["size"])
+		if key in old:
+			print(f"{r['model']:<24} {r['case']:<7} {r['size']:>6} {old[key]['steps_per_s']:>10.1f} -> "
+				  f"{r['steps_per_s']:>10.1f} steps/s  x{r['steps_per_s'] / old[key]['steps_per_s']:.2f}"
+				  f"{'' if r.get('initial_state') == old[key].get('initial_state') else '  (different initial state)'}")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="benchmark the simulations headless over a sweep of problem sizes")
+	parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+	parser.add_argument("--steps", type=int, default=100)
+	parser.add_argument("--warmup", type=int, default=5)
+	parser.add_argument("--memory-steps", type=int, default=10)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--out", default="benchmark.json")
+	parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+	args = parser.parse_args()
+
+	if args.compare:
+		compare(*args.compare)
+		return
+	report = run(args.models, args.steps, args.warmup, args.memory_steps, args.seed)
+	with open(args.out, "w") as f:
+		json.dump(report, f, indent=1, sort_keys=True)
+
+
+if __name__ == "__main__":
+	main()
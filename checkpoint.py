@@ -0,0 +1,139 @@
+# append-only checkpoint files: each frame is a fixed preamble, a json header and the model's arrays packed
+# at aligned offsets, so a reader can memory-map any array of any past frame without loading the file.
+#   preamble  MAGIC, header length (uint32), reserved (uint32), frame length (uint64)
+#   header    json: step, model meta, random/np.random scalar state, and name/dtype/shape/offset per array
+#   data      starts at the next ALIGN boundary after the header, array offsets are relative to it
+# a frame cut short by a crash is ignored by readers and dropped by the next writer.
+
+import json
+import os
+import random
+import struct
+import numpy as np
+
+MAGIC = b"SIMCKPT1"
+PREAMBLE = struct.Struct("<8sIIQ")
+ALIGN = 64
+
+
+def aligned(n):
+	return -(-n // ALIGN) * ALIGN
+
+
+# python's and numpy's global generators: scalars for the header, the key tables as arrays
+def rng_state():
+	version, keys, gauss = random.getstate()
+	name, np_keys, pos, has_gauss, cached = np.random.get_state()
+	meta = {"random": [version, gauss], "np_random": [name, int(pos), int(has_gauss), float(cached)]}
+	return meta, {"random.keys": np.array(keys, dtype=np.uint64), "np_random.keys": np.asarray(np_keys, dtype=np.uint32)}
+
+
+def set_rng_state(meta, arrays):
+	version, gauss = meta["random"]
+	random.setstate((version, tuple(arrays["random.keys"].tolist()), gauss))
+	name, pos, has_gauss, cached = meta["np_random"]
+	np.random.set_state((name, np.array(arrays["np_random.keys"]), pos, has_gauss, cached))
+
+
+# (frame start, data start, header) of the complete frames in path, and where the last complete frame ends
+def scan(path):
+	frames = []
+	end = 0
+	size = os.path.getsize(path)
+	with open(path, "rb") as f:
+		while end + PREAMBLE.size <= size:
+			f.seek(end)
+			magic, header_length, _, frame_length = PREAMBLE.unpack(f.read(PREAMBLE.size))
+			if magic != MAGIC or end + frame_length > size:
+				break
+			header = json.loads(f.read(header_length))
+			frames.append((end, end + aligned(PREAMBLE.size + header_length), header))
+			end += frame_length
+	return frames, end
+
+
+class Writer:
+
+	# append=False starts the file over; either way an existing file that is not a checkpoint is left alone
+	def __init__(self, path, append=True):
+		self.path = path
+		if os.path.exists(path) and os.path.getsize(path):
+			with open(path, "rb") as f:
+				if f.read(len(MAGIC)) != MAGIC:
+					raise ValueError(f"{path} is not a checkpoint file")
+			_, end = scan(path)
+			with open(path, "r+b") as f:
+				f.truncate(end if append else 0)
+		self.file = open(path, "ab")
+
+	# one frame holding meta (json-able) and arrays (name -> ndarray) plus the global rng state
+	def write(self, step, model, meta, arrays, sync=False):
+		rng_meta, rng_arrays = rng_state()
+		arrays = {name: np.ascontiguousarray(array) for name, array in dict(arrays, **rng_arrays).items()}
+		layout = []
+		offset = 0
+		for name, array in arrays.items():
+			layout.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+			offset = aligned(offset + array.nbytes)
+		encoded = json.dumps({"step": step, "model": model, "meta": meta, "rng": rng_meta, "arrays": layout}).encode()
+		data = aligned(PREAMBLE.size + len(encoded))
+
+		self.file.write(PREAMBLE.pack(MAGIC, len(encoded), 0, data + offset))
+		self.file.write(encoded)
+		position = PREAMBLE.size + len(encoded)
+		for entry, array in zip(layout, arrays.values()):
+			self.file.write(b"\0" * (data + entry["offset"] - position))
+			self.file.write(array.tobytes())
+			position = data + entry["offset"] + array.nbytes
+		self.file.write(b"\0" * (data + offset - position))
+		self.file.flush()
+		if sync:
+			os.fsync(self.file.fileno())
+
+	def save(self, game, step, sync=False):
+		meta, arrays = game.state()
+		self.write(step, type(game).__module__, meta, arrays, sync)
+
+	def close(self):
+		self.file.close()
+
+
+class Checkpoint:
+
+	def __init__(self, path):
+		self.path = path
+		self.frames, _ = scan(path)
+
+	def __len__(self):
+		return len(self.frames)
+
+	@property
+	def steps(self):
+		return [header["step"] for _, _, header in self.frames]
+
+	# the i-th frame's header and its arrays as read-only memory maps
+	def frame(self, i=-1):
+		_, data, header = self.frames[i]
+		arrays = {}
+		for entry in header["arrays"]:
+			shape = tuple(entry["shape"])
+			if 0 in shape:
+				arrays[entry["name"]] = np.zeros(shape, dtype=entry["dtype"])
+			else:
+				arrays[entry["name"]] = np.memmap(self.path, dtype=entry["dtype"], mode="r", offset=data + entry["offset"], shape=shape)
+		return header, arrays
+
+	# the last frame at or before step
+	def index(self, step):
+		steps = self.steps
+		i = np.searchsorted(steps, step, side="right") - 1
+		if i < 0:
+			raise KeyError(step)
+		return int(i)
+
+	# put game and the global rng back to the i-th frame; returns that frame's step
+	def restore(self, game, i=-1):
+		header, arrays = self.frame(i)
+		set_rng_state(header["rng"], arrays)
+		game.restore(header["meta"], arrays)
+		return header["step"]
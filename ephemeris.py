@@ -0,0 +1,73 @@
+# precomputed body trajectories stored as memory-mapped .npy files, keyed by initial conditions and timestep
+
+import hashlib
+import json
+import os
+import numpy as np
+
+
+class Ephemeris:
+
+	def __init__(self, path):
+		with open(path + ".json") as f:
+			meta = json.load(f)
+		self.dt = meta["dt"]
+		self.t0 = meta["t0"]
+		self.steps = meta["steps"]
+		# states[k] holds x, y, x_vel, y_vel of every body at time t0 + k * dt
+		self.states = np.load(path + ".npy", mmap_mode="r")
+
+	@property
+	def end(self):
+		return self.t0 + self.steps * self.dt
+
+	@staticmethod
+	def key(bodies, dt, G):
+		digest = hashlib.sha1()
+		for array in [bodies.pos, bodies.vel, bodies.mass]:
+			digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+		digest.update(repr((dt, G, bodies.t, type(bodies.integrator).__name__)).encode())
+		return digest.hexdigest()[:16]
+
+	# integrate bodies for steps steps of dt, writing each state straight into the memory map
+	@classmethod
+	def build(cls, bodies, dt, steps, path):
+		tmp = path + ".tmp.npy"
+		states = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float64, shape=(steps + 1, len(bodies), 4))
+		t0 = bodies.t
+		states[0] = np.hstack([bodies.pos, bodies.vel])
+		for k in range(1, steps + 1):
+			bodies.step(dt)
+			states[k] = np.hstack([bodies.pos, bodies.vel])
+		states.flush()
+		del states
+		os.replace(tmp, path + ".npy")
+		with open(path + ".json", "w") as f:
+			json.dump({"dt": dt, "t0": t0, "steps": steps}, f)
+		return cls(path)
+
+	# reuse a cached ephemeris covering at least steps steps, otherwise integrate a copy of bodies
+	@classmethod
+	def load_or_build(cls, bodies, dt, steps, G, directory="ephemeris"):
+		os.makedirs(directory, exist_ok=True)
+		path = os.path.join(directory, cls.key(bodies, dt, G))
+		if os.path.exists(path + ".json"):
+			ephemeris = cls(path)
+			if ephemeris.steps >= steps:
+				return ephemeris
+		return cls.build(bodies.copy(), dt, steps, path)
+
+	# cubic hermite interpolation of positions and velocities between the two samples around t
+	def state(self, t):
+		s = (t - self.t0) / self.dt
+		k = min(max(int(np.floor(s)), 0), self.steps - 1)
+		s -= k
+		a, b = self.states[k], self.states[k + 1]
+		p0, v0, p1, v1 = a[:, :2], a[:, 2:] * self.dt, b[:, :2], b[:, 2:] * self.dt
+		s2, s3 = s * s, s * s * s
+		pos = (2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * v0 + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * v1
+		vel = ((6 * s2 - 6 * s) * p0 + (3 * s2 - 4 * s + 1) * v0 + (-6 * s2 + 6 * s) * p1 + (3 * s2 - 2 * s) * v1) / self.dt
+		return pos, vel
+
+	def positions(self, t):
+		return self.state(t)[0]
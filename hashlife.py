@@ -0,0 +1,161 @@
+# Hashlife: hash-consed quadtree with memoized futures for Conway's game of life
+
+class Node:
+	__slots__ = ("k", "a", "b", "c", "d", "n")
+
+	# a, b, c, d are the nw, ne, sw, se quadrants; k is the level (side 2**k); n is the population
+	def __init__(self, k, a, b, c, d, n):
+		self.k = k
+		self.a = a
+		self.b = b
+		self.c = c
+		self.d = d
+		self.n = n
+
+
+ON = Node(0, None, None, None, None, 1)
+OFF = Node(0, None, None, None, None, 0)
+
+
+class Hashlife:
+
+	def __init__(self, max_cache=2**20):
+		self.max_cache = max_cache
+		self.nodes = {}
+		self.results = {}
+		self.zeros = [OFF]
+
+	def join(self, a, b, c, d):
+		key = (a, b, c, d)
+		node = self.nodes.get(key)
+		if node is None:
+			# dropping the table only loses sharing; nodes already handed out stay valid
+			if len(self.nodes) >= self.max_cache:
+				self.nodes.clear()
+			node = Node(a.k + 1, a, b, c, d, a.n + b.n + c.n + d.n)
+			self.nodes[key] = node
+		return node
+
+	def zero(self, k):
+		while len(self.zeros) <= k:
+			z = self.zeros[-1]
+			self.zeros.append(self.join(z, z, z, z))
+		return self.zeros[k]
+
+	# embed a node in the centre of an empty node one level up
+	def centre(self, m):
+		z = self.zero(m.k - 1)
+		return self.join(self.join(z, z, z, m.a), self.join(z, z, m.b, z),
+				   self.join(z, m.c, z, z), self.join(m.d, z, z, z))
+
+	# true when all live cells sit in the central quarter of the node
+	@staticmethod
+	def is_padded(m):
+		return (m.a.n == m.a.d.d.n and m.b.n == m.b.c.c.n and
+				m.c.n == m.c.b.b.n and m.d.n == m.d.a.a.n)
+
+	def life(self, nw, n, ne, w, e, sw, s, se, centre):
+		outer = nw.n + n.n + ne.n + w.n + e.n + sw.n + s.n + se.n
+		return ON if outer == 3 or (outer == 2 and centre.n) else OFF
+
+	# one generation of the central 2x2 of a 4x4 node
+	def life_4x4(self, m):
+		a, b, c, d = m.a, m.b, m.c, m.d
+		nw = self.life(a.a, a.b, b.a, a.c, b.c, c.a, c.b, d.a, a.d)
+		ne = self.life(a.b, b.a, b.b, a.d, b.d, c.b, d.a, d.b, b.c)
+		sw = self.life(a.c, a.d, b.c, c.a, d.a, c.c, c.d, d.c, c.b)
+		se = self.life(a.d, b.c, b.d, c.b, d.b, c.d, d.c, d.d, d.a)
+		return self.join(nw, ne, sw, se)
+
+	# centre of m (one level down) advanced by 2**j generations, j <= m.k - 2
+	def successor(self, m, j):
+		j = min(j, m.k - 2)
+		key = (m, j)
+		result = self.results.get(key)
+		if result is not None:
+			return result
+
+		if m.n == 0:
+			result = m.a
+		elif m.k == 2:
+			result = self.life_4x4(m)
+		else:
+			a, b, c, d = m.a, m.b, m.c, m.d
+			join = self.join
+			c1 = self.successor(a, j)
+			c2 = self.successor(join(a.b, b.a, a.d, b.c), j)
+			c3 = self.successor(b, j)
+			c4 = self.successor(join(a.c, a.d, c.a, c.b), j)
+			c5 = self.successor(join(a.d, b.c, c.b, d.a), j)
+			c6 = self.successor(join(b.c, b.d, d.a, d.b), j)
+			c7 = self.successor(c, j)
+			c8 = self.successor(join(c.b, d.a, c.d, d.c), j)
+			c9 = self.successor(d, j)
+
+			if j < m.k - 2:
+				result = join(join(c1.d, c2.c, c4.b, c5.a), join(c2.d, c3.c, c5.b, c6.a),
+							  join(c4.d, c5.c, c7.b, c8.a), join(c5.d, c6.c, c8.b, c9.a))
+			else:
+				result = join(self.successor(join(c1, c2, c4, c5), j), self.successor(join(c2, c3, c5, c6), j),
+							  self.successor(join(c4, c5, c7, c8), j), self.successor(join(c5, c6, c8, c9), j))
+
+		# evict the oldest half of the memo once it is full
+		if len(self.results) >= self.max_cache:
+			for old in list(self.results)[:len(self.results) // 2]:
+				del self.results[old]
+		self.results[key] = result
+		return result
+
+	def build(self, cells, k, x0, y0):
+		if not cells:
+			return self.zero(k)
+		if k == 0:
+			return ON
+		half = 1 << (k - 1)
+		quads = [[], [], [], []]
+		for x, y in cells:
+			quads[(x >= x0 + half) + 2 * (y >= y0 + half)].append((x, y))
+		return self.join(self.build(quads[0], k - 1, x0, y0), self.build(quads[1], k - 1, x0 + half, y0),
+						 self.build(quads[2], k - 1, x0, y0 + half), self.build(quads[3], k - 1, x0 + half, y0 + half))
+
+	def expand(self, m, x0, y0, cells):
+		if m.n == 0:
+			return cells
+		if m.k == 0:
+			cells.append((x0, y0))
+			return cells
+		half = 1 << (m.k - 1)
+		self.expand(m.a, x0, y0, cells)
+		self.expand(m.b, x0 + half, y0, cells)
+		self.expand(m.c, x0, y0 + half, cells)
+		self.expand(m.d, x0 + half, y0 + half, cells)
+		return cells
+
+	# advance a set of (x, y) live cells by n generations on the unbounded plane
+	def advance(self, cells, n):
+		cells = list(cells)
+		if not cells or n == 0:
+			return set(cells)
+
+		x0 = min(x for x, _ in cells)
+		y0 = min(y for _, y in cells)
+		size = max(max(x for x, _ in cells) - x0, max(y for _, y in cells) - y0) + 1
+		k = max(size - 1, 1).bit_length()
+		node = self.build(cells, k, x0, y0)
+
+		j = n.bit_length() - 1
+		while n:
+			if n & (1 << j):
+				while node.k < j + 3 or not self.is_padded(node):
+					half = 1 << (node.k - 1)
+					node = self.centre(node)
+					x0 -= half
+					y0 -= half
+				quarter = 1 << (node.k - 2)
+				node = self.successor(node, j)
+				x0 += quarter
+				y0 += quarter
+				n -= 1 << j
+			j -= 1
+
+		return set(self.expand(node, x0, y0, []))
@@ -0,0 +1,93 @@
+# run any of the simulations without a window, event polling or frame cap
+#   python headless.py Sugarscape --steps 10000 --seed 1
+#   python headless.py Sugarscape --steps 10000 --checkpoint run.ckpt --every 500 [--resume]
+
+import argparse
+import importlib
+import math
+import os
+import random
+import time
+import numpy as np
+from metrics import sink_for_path
+from checkpoint import Checkpoint, Writer
+
+MODELS = ["Game_Of_Life", "Models_Of_Segregation", "Sugarscape", "SolarSystem", "Gravitational_Slingshot"]
+
+
+def launch_ships(game, num):
+	for _ in range(num):
+		if hasattr(game, "planets"):
+			angle = random.uniform(0, 2 * math.pi)
+			game.create_ship((0, 0), (math.cos(angle), math.sin(angle)))
+		else:
+			location = (random.uniform(0, game.Width), random.uniform(0, game.Height))
+			target = (location[0] + random.uniform(-200, 200), location[1] + random.uniform(-200, 200))
+			game.create_ship(location, target)
+
+
+def make_game(name, seed=None, ships=0, **kwargs):
+	module = importlib.import_module(name)
+	if seed is not None:
+		random.seed(seed)
+		np.random.seed(seed)
+	game = module.Game(headless=True, **kwargs)
+	if name == "Game_Of_Life":
+		game.grid.reset()
+	if ships and hasattr(game, "create_ship"):
+		launch_ships(game, ships)
+	return game
+
+
+# runs the model up to step number steps. with checkpoint set, a frame is written every every steps into a
+# fresh file; resume continues from the file's last frame and appends to it
+def run(name, steps, seed=None, ships=0, checkpoint=None, every=0, resume=False, **kwargs):
+	game = make_game(name, seed, ships, **kwargs)
+	first = 0
+	if checkpoint and resume and os.path.exists(checkpoint):
+		first = Checkpoint(checkpoint).restore(game)
+	writer = Writer(checkpoint, append=resume) if checkpoint and every else None
+	start = time.perf_counter()
+	for step in range(first + 1, steps + 1):
+		game.step()
+		if writer is not None and step % every == 0:
+			writer.save(game, step)
+	elapsed = time.perf_counter() - start
+	if writer is not None:
+		writer.close()
+	if hasattr(game, "metrics"):
+		game.metrics.close()
+	return game, max(steps - first, 0), elapsed
+
+
+def main():
+	parser = argparse.ArgumentParser(description="run a simulation headless for a number of steps")
+	parser.add_argument("model", choices=MODELS)
+	parser.add_argument("--steps", type=int, default=1000, help="step number to run to, counted from the start when resuming")
+	parser.add_argument("--seed", type=int, default=None)
+	parser.add_argument("--width", type=int, default=None)
+	parser.add_argument("--height", type=int, default=None)
+	parser.add_argument("--tile", type=int, default=None)
+	parser.add_argument("--ships", type=int, default=0)
+	parser.add_argument("--metrics", default=None, help="csv or npz file for per-step statistics (Sugarscape)")
+	parser.add_argument("--checkpoint", default=None, help="checkpoint file, overwritten unless --resume")
+	parser.add_argument("--every", type=int, default=100, help="steps between checkpoint frames")
+	parser.add_argument("--resume", action="store_true", help="continue from the last frame of --checkpoint")
+	args = parser.parse_args()
+
+	kwargs = {}
+	if args.width is not None:
+		kwargs["Width"] = args.width
+	if args.height is not None:
+		kwargs["Height"] = args.height
+	if args.tile is not None:
+		kwargs["Tile_size"] = args.tile
+	if args.metrics is not None:
+		kwargs["sinks"] = [sink_for_path(args.metrics)]
+
+	game, steps, elapsed = run(args.model, args.steps, args.seed, args.ships, args.checkpoint, args.every, args.resume, **kwargs)
+	print(f"{args.model}: {steps} steps in {elapsed:.3f}s ({steps / max(elapsed, 1e-9):.1f} steps/s)")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,129 @@
+# time integrators for the gravity simulations
+# every integrator advances (pos, vel) arrays of shape (n, 2) from t to t + dt under acc(pos, t)
+
+import numpy as np
+
+
+# semi-implicit euler, the scheme the games used originally
+class Euler:
+	def advance(self, pos, vel, t, dt, acc):
+		vel = vel + acc(pos, t) * dt
+		pos = pos + vel * dt
+		return pos, vel
+
+
+# drift-kick-drift leapfrog: symplectic, second order, one force evaluation per step
+class Leapfrog:
+	def advance(self, pos, vel, t, dt, acc):
+		pos = pos + vel * (dt / 2)
+		vel = vel + acc(pos, t + dt / 2) * dt
+		pos = pos + vel * (dt / 2)
+		return pos, vel
+
+
+# Yoshida's fourth order symplectic composition of leapfrog, three force evaluations per step
+class Yoshida:
+	W1 = 1 / (2 - 2 ** (1 / 3))
+	W0 = -2 ** (1 / 3) * W1
+	C = [W1 / 2, (W0 + W1) / 2, (W0 + W1) / 2, W1 / 2]
+	D = [W1, W0, W1]
+
+	def advance(self, pos, vel, t, dt, acc):
+		for i in range(3):
+			pos = pos + vel * (self.C[i] * dt)
+			t += self.C[i] * dt
+			vel = vel + acc(pos, t) * (self.D[i] * dt)
+		pos = pos + vel * (self.C[3] * dt)
+		return pos, vel
+
+
+# Dormand-Prince RK45 with embedded error estimate; takes as many internal steps as the tolerance needs
+# to cover dt and remembers the last step size for the next call
+class RK45:
+	A = [[],
+		 [1 / 5],
+		 [3 / 40, 9 / 40],
+		 [44 / 45, -56 / 15, 32 / 9],
+		 [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+		 [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+		 [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+	C = [0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1]
+	B = [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0]
+	E = [71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]
+
+	def __init__(self, rtol=1e-8, atol=1e-12):
+		self.rtol = rtol
+		self.atol = atol
+		self.h = None
+		self.accepted = 0
+		self.rejected = 0
+
+	def attempt(self, pos, vel, t, h, acc):
+		kx, kv = [], []
+		for i in range(7):
+			x, v = pos, vel
+			for j, a in enumerate(self.A[i]):
+				if a:
+					x = x + kx[j] * (a * h)
+					v = v + kv[j] * (a * h)
+			kx.append(v)
+			kv.append(acc(x, t + self.C[i] * h))
+		new_pos = pos + sum(kx[i] * (b * h) for i, b in enumerate(self.B) if b)
+		new_vel = vel + sum(kv[i] * (b * h) for i, b in enumerate(self.B) if b)
+		err_pos = sum(kx[i] * (e * h) for i, e in enumerate(self.E) if e)
+		err_vel = sum(kv[i] * (e * h) for i, e in enumerate(self.E) if e)
+		error = max(np.abs(err_pos).max() / (self.atol + self.rtol * max(np.abs(pos).max(), np.abs(new_pos).max())),
+					np.abs(err_vel).max() / (self.atol + self.rtol * max(np.abs(vel).max(), np.abs(new_vel).max())))
+		return new_pos, new_vel, error
+
+	def advance(self, pos, vel, t, dt, acc):
+		end = t + dt
+		h = dt if self.h is None else self.h
+		while t < end:
+			# the last step is shortened to land on end without shrinking the proposed step size
+			clipped = h >= end - t
+			step = end - t if clipped else h
+			new_pos, new_vel, error = self.attempt(pos, vel, t, step, acc)
+			factor = 5.0 if error == 0 else min(5.0, max(0.2, 0.9 * error ** -0.2))
+			if error <= 1:
+				pos, vel = new_pos, new_vel
+				t = end if clipped else t + step
+				self.accepted += 1
+				if not clipped:
+					h = step * factor
+			else:
+				self.rejected += 1
+				h = step * factor
+		self.h = h
+		return pos, vel
+
+
+INTEGRATORS = {"euler": Euler, "leapfrog": Leapfrog, "yoshida": Yoshida, "rk45": RK45}
+
+
+def kinetic_energy(vel, mass):
+	return 0.5 * (mass * (vel ** 2).sum(1)).sum()
+
+
+def potential_energy(pos, mass, G, block=512):
+	total = 0.0
+	n = len(mass)
+	for start in range(0, n, block):
+		end = min(start + block, n)
+		d = pos[None, start:, :] - pos[start:end, None, :]
+		r = np.sqrt((d ** 2).sum(-1))
+		r[np.tril_indices(end - start)] = np.inf
+		total -= G * (mass[start:end, None] * mass[None, start:] / r).sum()
+	return total
+
+
+def energy(pos, vel, mass, G):
+	return kinetic_energy(vel, mass) + potential_energy(pos, mass, G)
+
+
+def angular_momentum(pos, vel, mass):
+	return (mass * (pos[:, 0] * vel[:, 1] - pos[:, 1] * vel[:, 0])).sum()
+
+
+def drift(value, initial):
+	return (value - initial) / abs(initial) if initial else value - initial
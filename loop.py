@@ -0,0 +1,126 @@
+# fixed-timestep driver for any Game: the model advances in steps of step_dt simulated seconds, decoupled
+# from the frame rate, so one frame can run many steps (fast-forward) or none (slow motion)
+#   python loop.py SolarSystem --speed 1000
+#   python loop.py Sugarscape --speed 50
+
+import argparse
+import importlib
+import time
+import pygame
+from headless import MODELS
+
+
+# the slingshot objects draw at their rect
+def place_rect(obj):
+	obj.rect.center = (obj.x, obj.y)
+
+
+# model: (objects whose x, y are blended between the last two steps when drawing, function syncing anything else an
+# object draws from after x, y changed, largest step in world units that is still motion rather than a teleport)
+MOVERS = {
+	"SolarSystem": (lambda game: game.planets + game.ships, None, None),
+	# the planet wraps from the left edge back to the right one
+	"Gravitational_Slingshot": (lambda game: [game.planet] + game.ships, place_rect, lambda game: game.Width / 2),
+}
+
+
+class Loop:
+	# share of the frame the model steps may use before the loop throttles the speed
+	BUDGET = 0.8
+
+	# step_dt defaults to the game's own pace: update_freq for the grid games, one step per frame otherwise
+	def __init__(self, game, speed=1.0, step_dt=None, fps=None, interpolate=True):
+		self.game = game
+		self.fps = fps or getattr(game, "FPS", 60)
+		if step_dt is None:
+			step_dt = game.update_freq / 1000 if hasattr(game, "update_freq") else 1 / self.fps
+		self.step_dt = step_dt
+		self.speed = speed
+		self.accumulator = 0.0
+		self.step_cost = 0.0
+		self.steps = 0
+		self.effective_speed = 0.0
+		movers = MOVERS.get(type(game).__module__) if interpolate else None
+		self.movers, self.place, max_jump = movers or (None, None, None)
+		self.max_jump = max_jump(game) if max_jump else None
+		self.previous = {}
+		self.caption = pygame.display.get_caption()[0] if pygame.display.get_init() else ""
+
+	# run as many whole steps as the accumulated time asks for, within the frame budget
+	def advance(self, frame_time):
+		if getattr(self.game, "pause", False):
+			self.accumulator = 0.0
+			return 0
+		self.accumulator += frame_time * self.speed
+		budget = self.BUDGET / self.fps
+		start = time.perf_counter()
+		steps = 0
+		while self.accumulator >= self.step_dt:
+			if self.movers is not None:
+				self.previous = {id(obj): (obj.x, obj.y) for obj in self.movers(self.game)}
+			t = time.perf_counter()
+			self.game.step()
+			# moving average of the step cost, used to stop before a step would overrun the budget
+			self.step_cost = 0.9 * self.step_cost + 0.1 * (time.perf_counter() - t) if self.steps else time.perf_counter() - t
+			self.accumulator -= self.step_dt
+			self.steps += 1
+			steps += 1
+			if time.perf_counter() - start + self.step_cost > budget:
+				# throttle: drop the backlog instead of trying to catch up on later frames
+				self.accumulator = min(self.accumulator, self.step_dt)
+				break
+		self.effective_speed = steps * self.step_dt / frame_time if frame_time else 0.0
+		return steps
+
+	# draw with movers placed alpha of the way from their previous to their current step
+	def draw(self):
+		if self.movers is None or not self.previous:
+			self.game.draw()
+			return
+		alpha = min(self.accumulator / self.step_dt, 1.0)
+		saved = []
+		for obj in self.movers(self.game):
+			if id(obj) not in self.previous:
+				continue
+			x0, y0 = self.previous[id(obj)]
+			if self.max_jump is not None and max(abs(obj.x - x0), abs(obj.y - y0)) > self.max_jump:
+				continue
+			saved.append((obj, obj.x, obj.y))
+			obj.x, obj.y = x0 + (obj.x - x0) * alpha, y0 + (obj.y - y0) * alpha
+			if self.place is not None:
+				self.place(obj)
+		self.game.draw()
+		for obj, x, y in saved:
+			obj.x, obj.y = x, y
+			if self.place is not None:
+				self.place(obj)
+
+	def run(self):
+		game = self.game
+		clock = getattr(game, "clock", None) or pygame.time.Clock()
+		frames = 0
+		while game.running:
+			frame_time = clock.tick(self.fps) / 1000
+			game.get_input()
+			self.advance(frame_time)
+			self.draw()
+			frames += 1
+			if frames % self.fps == 0:
+				pygame.display.set_caption(f"{self.caption} x{self.effective_speed:.0f}")
+		pygame.quit()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="play a simulation with a fixed-timestep loop")
+	parser.add_argument("model", choices=MODELS)
+	parser.add_argument("--speed", type=float, default=1.0, help="simulated time per real time")
+	parser.add_argument("--step-dt", type=float, default=None, help="real seconds per step at speed 1")
+	parser.add_argument("--no-interpolate", action="store_true")
+	args = parser.parse_args()
+
+	game = importlib.import_module(args.model).Game()
+	Loop(game, args.speed, args.step_dt, interpolate=not args.no_interpolate).run()
+
+
+if __name__ == "__main__":
+	main()
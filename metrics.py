@@ -0,0 +1,185 @@
+# metrics pipeline: per-step statistics go into a ring buffer and are emitted to pluggable sinks
+
+import csv
+import threading
+import numpy as np
+import pygame
+
+
+class RingBuffer:
+
+	def __init__(self, fields, capacity=256):
+		self.fields = list(fields)
+		self.data = np.zeros((capacity, len(self.fields)))
+		self.capacity = capacity
+		self.head = 0
+		self.count = 0
+		self.pending = 0
+
+	def append(self, row):
+		self.data[self.head] = row
+		self.head = (self.head + 1) % self.capacity
+		self.count = min(self.count + 1, self.capacity)
+		self.pending = min(self.pending + 1, self.capacity)
+
+	# the last n rows, oldest first
+	def latest(self, n=None):
+		n = self.count if n is None else min(n, self.count)
+		return self.data[(np.arange(self.head - n, self.head)) % self.capacity]
+
+	# rows appended since the last drain, oldest first
+	def drain(self):
+		rows = self.latest(self.pending)
+		self.pending = 0
+		return rows
+
+
+class Sink:
+
+	# called for every record with the row as a dict and the optional raw sample
+	def observe(self, row, sample):
+		pass
+
+	# called with a block of buffered rows, shape (n, len(fields))
+	def write(self, fields, rows):
+		pass
+
+	# called from the game's draw with its screen, for sinks that show something in the window
+	def poll(self, screen):
+		pass
+
+	def close(self):
+		pass
+
+
+class CSVSink(Sink):
+
+	def __init__(self, path):
+		self.file = open(path, "w", newline="")
+		self.writer = csv.writer(self.file)
+		self.header = False
+
+	def write(self, fields, rows):
+		if not self.header:
+			self.writer.writerow(fields)
+			self.header = True
+		self.writer.writerows(rows.tolist())
+		self.file.flush()
+
+	def close(self):
+		self.file.close()
+
+
+class NPZSink(Sink):
+
+	def __init__(self, path):
+		self.path = path
+		self.fields = None
+		self.blocks = []
+
+	def write(self, fields, rows):
+		self.fields = fields
+		self.blocks.append(rows.copy())
+
+	def close(self):
+		if self.fields is not None:
+			rows = np.concatenate(self.blocks)
+			np.savez(self.path, **{field: rows[:, i] for i, field in enumerate(self.fields)})
+
+
+class CallbackSink(Sink):
+
+	def __init__(self, callback):
+		self.callback = callback
+
+	def observe(self, row, sample):
+		self.callback(row, sample)
+
+
+class PrintSink(Sink):
+
+	def __init__(self, format):
+		self.format = format
+
+	def observe(self, row, sample):
+		print(self.format.format(**row))
+
+
+# histogram of the latest sample, re-rendered at most once per interval seconds by a background thread onto an
+# off-screen agg canvas (the pyplot state machine is not touched); poll() blits the last finished image into the
+# top right corner of the game window
+class LivePlotSink(Sink):
+
+	def __init__(self, interval=1.0, size=(240, 180), bins=10):
+		self.interval = interval
+		self.size = size
+		self.bins = bins
+		self.sample = None
+		self.ready = None
+		self.surface = None
+		self.stopped = threading.Event()
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+
+	def observe(self, row, sample):
+		if sample is not None:
+			self.sample = sample.copy()
+
+	def run(self):
+		from matplotlib.figure import Figure
+		from matplotlib.backends.backend_agg import FigureCanvasAgg
+		figure = Figure(figsize=(self.size[0] / 100, self.size[1] / 100), dpi=100)
+		canvas = FigureCanvasAgg(figure)
+		axes = figure.add_subplot()
+		while not self.stopped.wait(self.interval):
+			sample, self.sample = self.sample, None
+			if sample is None:
+				continue
+			axes.clear()
+			axes.hist(sample, self.bins, density=True)
+			canvas.draw()
+			self.ready = (bytes(canvas.buffer_rgba()), canvas.get_width_height())
+
+	def poll(self, screen):
+		ready, self.ready = self.ready, None
+		if ready is not None:
+			self.surface = pygame.image.frombuffer(*ready, "RGBA")
+		if self.surface is not None:
+			screen.blit(self.surface, (screen.get_width() - self.surface.get_width(), 0))
+
+	def close(self):
+		self.stopped.set()
+
+
+class Metrics:
+
+	def __init__(self, fields, sinks=(), capacity=256):
+		self.fields = list(fields)
+		self.buffer = RingBuffer(self.fields, capacity)
+		self.sinks = list(sinks)
+
+	def record(self, row, sample=None):
+		self.buffer.append([row[field] for field in self.fields])
+		for sink in self.sinks:
+			sink.observe(row, sample)
+		if self.buffer.pending == self.buffer.capacity:
+			self.flush()
+
+	def flush(self):
+		if self.buffer.pending:
+			rows = self.buffer.drain()
+			for sink in self.sinks:
+				sink.write(self.fields, rows)
+
+	def poll(self, screen):
+		for sink in self.sinks:
+			sink.poll(screen)
+
+	def close(self):
+		self.flush()
+		for sink in self.sinks:
+			sink.close()
+
+
+def sink_for_path(path):
+	return NPZSink(path) if path.endswith(".npz") else CSVSink(path)
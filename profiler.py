@@ -0,0 +1,180 @@
+# per-phase profiling for the Game loops. attach() wraps the Game phases and each model's hot methods at
+# class level with timers, detach() puts the originals back, so an unprofiled game runs untouched code.
+#   python profiler.py Sugarscape --trace sugarscape.json --memory
+#   python profiler.py SolarSystem --headless --steps 500 --trace solar.json
+# traces are in the chrome trace event format (chrome://tracing, ui.perfetto.dev)
+
+import argparse
+import collections
+import functools
+import importlib
+import json
+import time
+import tracemalloc
+import pygame
+
+# label: class.method inside the model module; the Game phases are added for every model
+PHASES = {
+	"Game_Of_Life": {"generation": "Grid.update", "generation (numpy)": "NumpyGrid.update", "render": "GridRenderer.draw"},
+	"Models_Of_Segregation": {"moves": "Grid.update", "moves (array)": "ArrayGrid.update", "render": "GridRenderer.draw"},
+	"Sugarscape": {"agents": "Population.update", "growback": "Grid.grow", "stats": "Population.stats",
+				   "metrics": "Metrics.record", "draw cells": "Grid.draw"},
+	"SolarSystem": {"forces": "Bodies.step", "swarms": "Swarm.step", "ships": "Spacecraft.move",
+					"planets": "Planet.draw", "trails": "Trail.draw"},
+	"Gravitational_Slingshot": {"planet": "Planet.move", "ships": "Spacecraft.move", "draw ships": "Spacecraft.draw"},
+}
+GAME_PHASES = {"input": "Game.get_input", "update": "Game.update", "step": "Game.step", "draw": "Game.draw"}
+
+
+class Profiler:
+
+	def __init__(self, window=60, memory=False, memory_interval=30, max_events=1000000, overlay=True):
+		self.window = window
+		self.memory = memory
+		self.memory_interval = memory_interval
+		self.max_events = max_events
+		self.overlay = overlay
+		self.origin = time.perf_counter_ns()
+		self.events = []
+		self.samples = []
+		self.tracing = False
+		self.totals = collections.defaultdict(int)
+		self.history = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+		self.frames = 0
+		self.memory_mb = (0.0, 0.0)
+		self.patched = []
+		self.lines = []
+		self.font = None
+
+	def timed(self, label, method):
+		@functools.wraps(method)
+		def wrapper(*args, **kwargs):
+			start = time.perf_counter_ns()
+			try:
+				return method(*args, **kwargs)
+			finally:
+				end = time.perf_counter_ns()
+				self.totals[label] += end - start
+				if len(self.events) < self.max_events:
+					self.events.append((label, start, end - start))
+		return wrapper
+
+	def patch(self, cls, name, wrapper):
+		self.patched.append((cls, name, cls.__dict__.get(name)))
+		setattr(cls, name, wrapper)
+
+	def attach(self, game):
+		module = importlib.import_module(type(game).__module__)
+		phases = dict(GAME_PHASES, **PHASES.get(module.__name__, {}))
+		for label, path in phases.items():
+			cls_name, name = path.split(".")
+			cls = getattr(module, cls_name)
+			if label == "draw":
+				self.patch(cls, name, self.drawing(self.timed(label, getattr(cls, name))))
+			else:
+				self.patch(cls, name, self.timed(label, getattr(cls, name)))
+		if self.memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.tracing = True
+		return self
+
+	def detach(self):
+		for cls, name, original in reversed(self.patched):
+			if original is None:
+				delattr(cls, name)
+			else:
+				setattr(cls, name, original)
+		self.patched = []
+		if self.tracing:
+			tracemalloc.stop()
+			self.tracing = False
+
+	# a rendered frame ends the profiling frame and gets the overlay on top
+	def drawing(self, draw):
+		@functools.wraps(draw)
+		def wrapper(game, *args, **kwargs):
+			result = draw(game, *args, **kwargs)
+			self.frame()
+			if self.overlay:
+				self.draw(game.screen)
+			return result
+		return wrapper
+
+	# close the current frame: per-phase totals go into the rolling windows
+	def frame(self):
+		for label, total in self.totals.items():
+			self.history[label].append(total)
+		for label in self.history:
+			if label not in self.totals:
+				self.history[label].append(0)
+		self.totals.clear()
+		self.frames += 1
+		if self.memory and self.frames % self.memory_interval == 0:
+			current, peak = tracemalloc.get_traced_memory()
+			self.memory_mb = (current / 2 ** 20, peak / 2 ** 20)
+			self.samples.append((time.perf_counter_ns(), *self.memory_mb))
+
+	# rolling mean milliseconds per frame of each phase
+	def averages(self):
+		return {label: sum(values) / len(values) / 1e6 for label, values in self.history.items() if values}
+
+	def draw(self, screen):
+		if self.font is None:
+			self.font = pygame.font.Font(None, 20)
+		# the text is re-rendered a few times a second, the blit happens every frame
+		if self.frames % 15 == 1 or not self.lines:
+			rows = [f"{label:<12} {ms:7.2f} ms" for label, ms in sorted(self.averages().items(), key=lambda item: -item[1])]
+			if self.memory:
+				rows.append(f"memory {self.memory_mb[0]:.1f} MB (peak {self.memory_mb[1]:.1f})")
+			self.lines = [self.font.render(row, True, (255, 255, 255), (0, 0, 0)) for row in rows]
+		width = max([line.get_width() for line in self.lines], default=0)
+		rect = pygame.Rect(0, 0, width + 8, 16 * len(self.lines) + 8)
+		screen.fill((0, 0, 0), rect)
+		for i, line in enumerate(self.lines):
+			screen.blit(line, (4, 4 + 16 * i))
+		pygame.display.update(rect)
+
+	def trace(self):
+		events = [{"name": label, "ph": "X", "ts": (start - self.origin) / 1000, "dur": duration / 1000, "pid": 0, "tid": 0}
+				  for label, start, duration in self.events]
+		events += [{"name": "memory", "ph": "C", "ts": (ns - self.origin) / 1000, "pid": 0,
+					"args": {"current_mb": current, "peak_mb": peak}} for ns, current, peak in self.samples]
+		return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+	def export(self, path):
+		with open(path, "w") as f:
+			json.dump(self.trace(), f)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="play or run a simulation with per-phase profiling")
+	parser.add_argument("model", choices=list(PHASES))
+	parser.add_argument("--headless", action="store_true")
+	parser.add_argument("--steps", type=int, default=1000)
+	parser.add_argument("--seed", type=int, default=None)
+	parser.add_argument("--memory", action="store_true", help="sample tracemalloc (slows every allocation)")
+	parser.add_argument("--trace", default=None, help="write a chrome trace json file")
+	args = parser.parse_args()
+
+	profiler = Profiler(memory=args.memory)
+	if args.headless:
+		from headless import make_game
+		game = make_game(args.model, args.seed)
+		profiler.attach(game)
+		for _ in range(args.steps):
+			game.step()
+			profiler.frame()
+	else:
+		game = importlib.import_module(args.model).Game()
+		profiler.attach(game)
+		game.play()
+	profiler.detach()
+
+	for label, ms in sorted(profiler.averages().items(), key=lambda item: -item[1]):
+		print(f"{label:<20} {ms:8.3f} ms/frame")
+	if args.trace:
+		profiler.export(args.trace)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,62 @@
+# renderer for the tile grid games: the grid lines are drawn once onto an overlay surface, and each frame
+# only the tiles whose value changed since the last frame are repainted and pushed to the display
+
+import pygame
+import numpy as np
+
+
+class GridRenderer:
+	# above this fraction of changed tiles one full redraw is cheaper than many small rects
+	FULL_REDRAW = 0.25
+
+	def __init__(self, screen, grid_width, grid_height, tile_size, palette, background, line_color):
+		self.screen = screen
+		self.grid_width = grid_width
+		self.grid_height = grid_height
+		self.tile_size = tile_size
+		self.colors = [tuple(color) for color in palette]
+		self.palette = np.array(palette, dtype=np.uint8)
+		self.background = background
+		self.overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+		width, height = screen.get_size()
+		for row in range(grid_height):
+			pygame.draw.line(self.overlay, line_color, (0, row * tile_size), (width, row * tile_size))
+		for col in range(grid_width):
+			pygame.draw.line(self.overlay, line_color, (col * tile_size, 0), (col * tile_size, height))
+		self.shown = None
+
+	# forget what is on screen so the next draw repaints everything
+	def invalidate(self):
+		self.shown = None
+
+	# codes[x, y] indexes the palette; returns the number of tiles repainted
+	def draw(self, codes):
+		if self.shown is None or codes.shape != self.shown.shape:
+			self.redraw(codes)
+			return codes.size
+
+		xs, ys = np.nonzero(codes != self.shown)
+		if not len(xs):
+			return 0
+		if len(xs) > self.FULL_REDRAW * codes.size:
+			self.redraw(codes)
+			return len(xs)
+
+		t = self.tile_size
+		rects = []
+		for x, y, code in zip(xs.tolist(), ys.tolist(), codes[xs, ys].tolist()):
+			rect = pygame.Rect(x * t, y * t, t, t)
+			self.screen.fill(self.colors[code], rect)
+			self.screen.blit(self.overlay, rect, rect)
+			rects.append(rect)
+		self.shown[xs, ys] = codes[xs, ys]
+		pygame.display.update(rects)
+		return len(xs)
+
+	def redraw(self, codes):
+		self.screen.fill(self.background)
+		surface = pygame.surfarray.make_surface(self.palette[codes])
+		self.screen.blit(pygame.transform.scale(surface, (self.grid_width * self.tile_size, self.grid_height * self.tile_size)), (0, 0))
+		self.screen.blit(self.overlay, (0, 0))
+		self.shown = codes.copy()
+		pygame.display.update()
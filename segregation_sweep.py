@@ -0,0 +1,112 @@
+# parameter sweep for Models_Of_Segregation: every (happy_value, choice_weight, size, seed) job runs an
+# ArrayGrid to equilibrium or max_steps on a process pool. workers write their row of a structured .npy
+# result file in place, so only job indices travel between processes.
+#   python segregation_sweep.py --happy 2 3 4 5 --empty 0.05 0.1 0.2 --sizes 50 100 --seeds 8 --processes 8
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+import numpy as np
+from Models_Of_Segregation import ArrayGrid
+
+RESULT = np.dtype([("happy_value", np.int64), ("empty", np.float64), ("blue", np.float64), ("red", np.float64),
+				   ("size", np.int64), ("seed", np.int64), ("steps", np.int64), ("converged", np.bool_),
+				   ("segregation", np.float64), ("unhappy", np.float64), ("seconds", np.float64)])
+
+results = None
+
+
+def open_results(path):
+	global results
+	results = np.lib.format.open_memmap(path, mode="r+")
+
+
+# steps is the number of updates until no agent was unhappy, or max_steps if that never happened
+def run_job(i, max_steps):
+	job = results[i]
+	np.random.seed(int(job["seed"]))
+	start = time.perf_counter()
+	grid = ArrayGrid(int(job["size"]), int(job["size"]), 1, int(job["happy_value"]),
+					 (float(job["empty"]), float(job["blue"]), float(job["red"])))
+	steps = 0
+	converged = not grid.unhappy().any()
+	while not converged and steps < max_steps:
+		grid.update()
+		steps += 1
+		converged = not grid.unhappy().any()
+	row = results[i:i + 1]
+	row["steps"] = steps
+	row["converged"] = converged
+	row["segregation"] = grid.segregation_index()
+	row["unhappy"] = grid.unhappy_fraction()
+	row["seconds"] = time.perf_counter() - start
+	results.flush()
+	return i
+
+
+def jobs(happy_values, weights, sizes, seeds):
+	rows = [(happy, *weight, size, seed, 0, False, np.nan, np.nan, np.nan)
+			for happy, weight, size, seed in itertools.product(happy_values, weights, sizes, seeds)]
+	return np.array(rows, dtype=RESULT)
+
+
+# writes the job table to path, fills it in on processes workers and returns it
+def sweep(path, happy_values=(3, 4, 5), weights=((0.1, 0.45, 0.45),), sizes=(50,), seeds=range(4),
+		  max_steps=1000, processes=None):
+	rows = jobs(happy_values, weights, sizes, seeds)
+	table = np.lib.format.open_memmap(path, mode="w+", dtype=RESULT, shape=rows.shape)
+	table[:] = rows
+	table.flush()
+	del table
+
+	processes = processes or os.cpu_count()
+	if processes == 1:
+		open_results(path)
+		for i in range(len(rows)):
+			run_job(i, max_steps)
+	else:
+		# longest jobs (big grids, high thresholds) are handed out first so the pool drains evenly
+		order = np.lexsort((-rows["happy_value"], -rows["size"])).tolist()
+		chunksize = max(1, len(order) // (processes * 8))
+		with multiprocessing.Pool(processes, initializer=open_results, initargs=(path,)) as pool:
+			for _ in pool.starmap(run_job, [(i, max_steps) for i in order], chunksize):
+				pass
+	return np.load(path)
+
+
+# mean outcome over seeds for every parameter combination
+def summary(table):
+	keys = ["happy_value", "empty", "blue", "size"]
+	print(f"{'happy':>5} {'empty':>6} {'blue':>6} {'size':>5} {'runs':>5} {'converged':>9} {'steps':>8} {'segregation':>11} {'unhappy':>8}")
+	groups = {}
+	for row in table:
+		groups.setdefault(tuple(row[key].item() for key in keys), []).append(row)
+	for (happy, empty, blue, size), rows in sorted(groups.items()):
+		rows = np.array(rows, dtype=RESULT)
+		print(f"{happy:>5} {empty:>6.2f} {blue:>6.2f} {size:>5} {len(rows):>5} {rows['converged'].mean():>9.2f} "
+			  f"{rows['steps'].mean():>8.1f} {rows['segregation'].mean():>11.3f} {rows['unhappy'].mean():>8.3f}")
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Schelling segregation parameter sweep on a process pool")
+	parser.add_argument("--happy", type=int, nargs="+", default=[3, 4, 5], help="happy_value thresholds")
+	parser.add_argument("--empty", type=float, nargs="+", default=[0.1], help="share of empty cells")
+	parser.add_argument("--blue", type=float, nargs="+", default=[0.5], help="share of agents that are blue")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[50])
+	parser.add_argument("--seeds", type=int, default=4, help="runs per parameter combination")
+	parser.add_argument("--max-steps", type=int, default=1000)
+	parser.add_argument("--processes", type=int, default=None)
+	parser.add_argument("--out", default="segregation_sweep.npy")
+	args = parser.parse_args()
+
+	weights = [(empty, (1 - empty) * blue, (1 - empty) * (1 - blue)) for empty in args.empty for blue in args.blue]
+	start = time.perf_counter()
+	table = sweep(args.out, args.happy, weights, args.sizes, range(args.seeds), args.max_steps, args.processes)
+	summary(table)
+	print(f"{len(table)} runs in {time.perf_counter() - start:.1f}s, results in {args.out}")
+
+
+if __name__ == "__main__":
+	main()
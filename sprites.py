@@ -0,0 +1,62 @@
+# caches shared by the gravity games: pre-rotated sprite frames and rendered text surfaces
+
+import pygame
+import assets
+
+ROTATION_STEPS = 360
+TEXT_CAPACITY = 4096
+
+fonts = {}
+frames = {}
+texts = {}
+registered = False
+
+
+# fonts and surfaces must not outlive pygame.quit(): a Font used after a re-init crashes the interpreter
+def clear():
+	global registered
+	fonts.clear()
+	frames.clear()
+	texts.clear()
+	registered = False
+
+
+# pygame forgets its quit functions once they ran, so the hook is registered again for every init that fills a cache
+def register():
+	global registered
+	if not registered:
+		pygame.register_quit(clear)
+		registered = True
+
+
+def font(size):
+	if size not in fonts:
+		register()
+		fonts[size] = pygame.font.Font(None, size)
+	return fonts[size]
+
+
+# the sprite at path scaled to size and rotated to steps evenly spaced angles, built once per (path, size, steps)
+def rotations(path, size, steps=ROTATION_STEPS):
+	key = (path, tuple(size), steps)
+	if key not in frames:
+		register()
+		image = assets.get(path, size)
+		frames[key] = [pygame.transform.rotate(image, i * 360 / steps) for i in range(steps)]
+	return frames[key]
+
+
+# the frame of a rotations list nearest to angle degrees
+def frame(images, angle):
+	return images[int(round(angle * len(images) / 360)) % len(images)]
+
+
+# rendered surface for a string, shared by every label using the same size and colour
+def text(string, size, color):
+	key = (string, size, color)
+	surface = texts.get(key)
+	if surface is None:
+		if len(texts) >= TEXT_CAPACITY:
+			texts.clear()
+		surface = texts[key] = font(size).render(string, True, color)
+	return surface